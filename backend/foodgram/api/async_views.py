@@ -0,0 +1,63 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, "ASYNC_READ_WORKERS", 16),
+            thread_name_prefix="async-read",
+        )
+    return _executor
+
+
+def _render(view, request, *args, **kwargs):
+    response = view(request, *args, **kwargs)
+    if hasattr(response, "render") and not response.is_rendered:
+        response.render()
+    return response
+
+
+def _render_with_own_connection(view, request, *args, **kwargs):
+    # Потоки пула не получают сигналов начала и конца запроса,
+    # поэтому соединения с базой проверяются здесь.
+    close_old_connections()
+    try:
+        return _render(view, request, *args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+def async_read_view(view):
+    """
+    Асинхронная обертка синхронной вьюхи для режима ASGI.
+
+    Django 3.2 выполняет все синхронные вьюхи процесса в одном потоке,
+    поэтому медленный запрос к базе задерживает остальные. Чтение
+    (GET, HEAD, OPTIONS) выполняется в отдельном пуле потоков
+    параллельно, запись по-прежнему идет через стандартный синхронный
+    адаптер Django.
+    """
+    read = sync_to_async(
+        _render_with_own_connection, thread_sensitive=False,
+        executor=get_executor(),
+    )
+    write = sync_to_async(_render, thread_sensitive=True)
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method in READ_METHODS:
+            return await read(view, request, *args, **kwargs)
+        return await write(view, request, *args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,165 @@
+import hashlib
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.permissions import SAFE_METHODS
+
+
+User = get_user_model()
+
+
+class TokenUserCache:
+    """
+    Кэш пользователей по токену: короткий в памяти процесса и общий
+    (CACHES["default"]). Ключом служит SHA-256 токена, сам токен
+    в кэш не попадает. Хранится снимок полей пользователя, кроме
+    excluded_fields: они остаются отложенными и читаются из базы при
+    обращении, а save() без update_fields их не перезаписывает.
+
+    Сигналы удаляют записи при выходе, удалении токена и изменении
+    пользователя (в том числе деактивации). Другие процессы узнают
+    об этом из общего кэша, а их локальные записи живут не дольше
+    local_timeout секунд. LocMemCache у каждого процесса свой, и
+    удаление в одном воркере не дошло бы до остальных, поэтому с ним
+    общий уровень не используется.
+    """
+
+    prefix = "auth-token"
+    max_local_entries = 10_000
+    excluded_fields = ("password",)
+
+    def __init__(self, alias="default"):
+        self.alias = alias
+        self._local = OrderedDict()
+        self._lock = Lock()
+
+    @property
+    def cache(self):
+        cache = caches[self.alias]
+        return None if isinstance(cache, LocMemCache) else cache
+
+    @property
+    def timeout(self):
+        return getattr(settings, "AUTH_TOKEN_CACHE_TIMEOUT", 300)
+
+    @property
+    def local_timeout(self):
+        return getattr(settings, "AUTH_TOKEN_LOCAL_CACHE_TIMEOUT", 5)
+
+    def _key(self, token_key):
+        digest = hashlib.sha256(token_key.encode()).hexdigest()
+        return f"{self.prefix}:{digest}"
+
+    def get(self, token_key):
+        """Пользователь по токену или None, если записи нет"""
+        key = self._key(token_key)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is not None and entry[0] < now:
+                del self._local[key]
+                entry = None
+        cache = self.cache
+        if entry is not None:
+            snapshot = entry[1]
+        else:
+            snapshot = cache.get(key) if cache is not None else None
+        if snapshot is None:
+            return None
+        if entry is None:
+            self._remember(key, snapshot)
+        return User.from_db(
+            User.objects.db, list(snapshot), list(snapshot.values()))
+
+    def set(self, token_key, user):
+        key = self._key(token_key)
+        snapshot = {
+            field.attname: getattr(user, field.attname)
+            for field in User._meta.concrete_fields
+            if field.name not in self.excluded_fields
+        }
+        if self.cache is not None:
+            self.cache.set(key, snapshot, self.timeout)
+        self._remember(key, snapshot)
+
+    def _remember(self, key, snapshot):
+        with self._lock:
+            self._local[key] = (time.monotonic() + self.local_timeout,
+                                snapshot)
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_local_entries:
+                self._local.popitem(last=False)
+
+    def delete(self, token_keys):
+        keys = [self._key(token_key) for token_key in token_keys]
+        if not keys:
+            return
+        with self._lock:
+            for key in keys:
+                self._local.pop(key, None)
+        if self.cache is not None:
+            self.cache.delete_many(keys)
+
+
+token_user_cache = TokenUserCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication, который берет пользователя из token_user_cache
+    и обращается к базе только при промахе. Подключается в
+    REST_FRAMEWORK["DEFAULT_AUTHENTICATION_CLASSES"] вместо
+    rest_framework.authentication.TokenAuthentication.
+
+    Кэш используется только для безопасных методов. Запросы на запись
+    получают пользователя из базы: снимок мог устареть, и его
+    сохранение вернуло бы поля, измененные после записи в кэш.
+    """
+
+    use_cache = True
+
+    def authenticate(self, request):
+        self.use_cache = request.method in SAFE_METHODS
+        return super().authenticate(request)
+
+    def authenticate_credentials(self, key):
+        if self.use_cache:
+            user = token_user_cache.get(key)
+            if user is not None:
+                return user, Token(key=key, user=user)
+        user, token = super().authenticate_credentials(key)
+        token_user_cache.set(key, user)
+        return user, token
+
+
+def forget_tokens(token_keys):
+    """
+    Удаляет записи сразу и еще раз после коммита: запрос, прочитавший
+    пользователя до коммита, мог успеть снова положить его в кэш.
+    """
+    token_keys = list(token_keys)
+    token_user_cache.delete(token_keys)
+    transaction.on_commit(lambda: token_user_cache.delete(token_keys))
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(instance, **kwargs):
+    forget_tokens([instance.key])
+
+
+@receiver(post_save, sender=User)
+def forget_changed_user_tokens(instance, created, **kwargs):
+    if created:
+        return
+    forget_tokens(
+        Token.objects.filter(user=instance).values_list("key", flat=True))
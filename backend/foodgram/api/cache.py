@@ -0,0 +1,208 @@
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_save,
+)
+from django.dispatch import receiver
+from recipes.models import Ingredient, Recipe, RecipeIngredient
+from rest_framework.response import Response
+
+
+User = get_user_model()
+
+CONTENT_GENERATION = "content"
+POPULARITY_GENERATION = "popularity"
+# Поля пользователя, которые отдаются в рецептах как автор
+# (см. api.serializers.CustomUserSerializer).
+AUTHOR_FIELDS = ("email", "username", "first_name", "last_name", "avatar")
+# Параметры, с которыми ответ зависит от пользователя целиком.
+PER_USER_FILTERS = ("is_favorited", "is_in_shopping_cart")
+
+
+class RecipeResponseCache:
+    """
+    Кэш ответов списка и карточки рецепта.
+
+    Хранится общая для всех часть ответа (как для анонимного посетителя).
+    Ключ включает номер поколения, который увеличивается сигналами при
+    изменении рецептов, поэтому устаревшие записи просто перестают
+    читаться. Для авторизованного пользователя поверх общей части
+    проставляются его флаги is_favorited, is_in_shopping_cart и
+    is_subscribed.
+    """
+
+    prefix = "recipe-response"
+
+    def __init__(self, alias="default"):
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @property
+    def timeout(self):
+        return getattr(settings, "RECIPE_CACHE_TIMEOUT", 300)
+
+    def _generation_key(self, name):
+        return f"{self.prefix}:generation:{name}"
+
+    def get_generation(self, name):
+        return self.cache.get_or_set(
+            self._generation_key(name), time.time_ns(), timeout=None)
+
+    def bump_generation(self, name):
+        try:
+            self.cache.incr(self._generation_key(name))
+        except ValueError:
+            self.cache.set(self._generation_key(name), time.time_ns(),
+                           timeout=None)
+
+    def _count(self, name):
+        key = f"{self.prefix}:stats:{name}"
+        self.cache.add(key, 0, timeout=None)
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            pass
+
+    def get_stats(self):
+        names = ("hits", "misses")
+        values = self.cache.get_many(
+            [f"{self.prefix}:stats:{name}" for name in names])
+        return {
+            name: values.get(f"{self.prefix}:stats:{name}", 0)
+            for name in names
+        }
+
+    def is_cacheable(self, request):
+        if request.method != "GET":
+            return False
+        return not (
+            request.user.is_authenticated
+            and any(name in request.query_params for name in PER_USER_FILTERS)
+        )
+
+    def get_key(self, request):
+        generations = [self.get_generation(CONTENT_GENERATION)]
+        if "ordering" in request.query_params:
+            generations.append(self.get_generation(POPULARITY_GENERATION))
+        query = sorted(request.query_params.lists())
+        raw_key = json.dumps(
+            [generations, request.get_host(), request.path, query])
+        return f"{self.prefix}:{hashlib.md5(raw_key.encode()).hexdigest()}"
+
+    def fetch(self, request, build_response):
+        """
+        Возвращает ответ из кэша или строит его через build_response
+        и сохраняет общую часть.
+        """
+        if not self.is_cacheable(request):
+            return build_response()
+        key = self.get_key(request)
+        shared_data = self.cache.get(key)
+        if shared_data is None:
+            self._count("misses")
+            response = build_response()
+            if response.status_code == 200:
+                self.cache.set(key, get_shared_data(response.data),
+                               self.timeout)
+            response["X-Cache"] = "MISS"
+            return response
+        self._count("hits")
+        if request.user.is_authenticated:
+            overlay_user_flags(shared_data, request.user)
+        return Response(shared_data, headers={"X-Cache": "HIT"})
+
+
+def _recipes_in(data):
+    if "results" in data:
+        return data["results"]
+    return [data]
+
+
+def get_shared_data(data):
+    """Копия ответа с флагами пользователя, как у анонимного посетителя"""
+    shared_data = json.loads(json.dumps(data))
+    for recipe in _recipes_in(shared_data):
+        recipe["is_favorited"] = False
+        recipe["is_in_shopping_cart"] = False
+        recipe["author"]["is_subscribed"] = False
+    return shared_data
+
+
+def overlay_user_flags(data, user):
+    """Проставляет флаги пользователя в общую часть ответа"""
+    recipes = _recipes_in(data)
+    recipe_ids = [recipe["id"] for recipe in recipes]
+    author_ids = {recipe["author"]["id"] for recipe in recipes}
+    favorited = set(user.favorite_recipes.filter(
+        id__in=recipe_ids).values_list("id", flat=True))
+    in_shopping_cart = set(user.shopping_cart.filter(
+        id__in=recipe_ids).values_list("id", flat=True))
+    subscribed = set(user.following.filter(
+        following__in=author_ids).values_list("following_id", flat=True))
+    for recipe in recipes:
+        recipe["is_favorited"] = recipe["id"] in favorited
+        recipe["is_in_shopping_cart"] = recipe["id"] in in_shopping_cart
+        recipe["author"]["is_subscribed"] = (
+            recipe["author"]["id"] in subscribed)
+
+
+recipe_response_cache = RecipeResponseCache()
+
+
+def _bump_after_commit(name):
+    transaction.on_commit(lambda: recipe_response_cache.bump_generation(name))
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_delete, sender=User)
+def invalidate_recipe_responses(**kwargs):
+    _bump_after_commit(CONTENT_GENERATION)
+
+
+@receiver(pre_save, sender=User)
+def remember_author_fields(instance, update_fields, **kwargs):
+    instance._old_author_fields = None
+    if instance.pk is not None and update_fields is None:
+        instance._old_author_fields = User.objects.filter(
+            pk=instance.pk).values_list(*AUTHOR_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+def invalidate_recipe_responses_on_user_change(instance, created,
+                                               update_fields, **kwargs):
+    # У нового пользователя еще нет рецептов. Вход, смена пароля
+    # и другие поля вне AUTHOR_FIELDS не меняют ответы.
+    if created:
+        return
+    if update_fields is not None:
+        changed = bool(set(update_fields) & set(AUTHOR_FIELDS))
+    else:
+        old_values = getattr(instance, "_old_author_fields", None)
+        changed = old_values is None or old_values != tuple(
+            getattr(instance, name) for name in AUTHOR_FIELDS)
+    if changed:
+        _bump_after_commit(CONTENT_GENERATION)
+
+
+@receiver(m2m_changed, sender=User.favorite_recipes.through)
+@receiver(m2m_changed, sender=User.shopping_cart.through)
+def invalidate_recipe_popularity(action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        _bump_after_commit(POPULARITY_GENERATION)
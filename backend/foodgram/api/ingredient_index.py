@@ -0,0 +1,141 @@
+import time
+from bisect import bisect_left
+from collections import namedtuple
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from recipes.models import Ingredient
+
+
+IndexState = namedtuple(
+    "IndexState", "ingredients names positions by_id version built_at")
+
+
+class IngredientIndex:
+    """
+    Отсортированный индекс ингредиентов по названию в памяти процесса.
+    Строится при первом обращении. Результаты поиска отдаются в порядке
+    сортировки модели (по name).
+
+    Сигналы модели сбрасывают индекс своего процесса и увеличивают
+    версию в общем кэше. Другие процессы сверяются с ней не чаще раза
+    в check_interval секунд. Индекс старше max_age секунд строится
+    заново в любом случае, чтобы подхватить изменения в обход
+    сигналов (например, COPY в load_ingredients).
+    """
+
+    version_key = "ingredient-index:version"
+
+    def __init__(self, alias="default"):
+        self.alias = alias
+        self._lock = Lock()
+        self._generation = 0
+        self._state = None
+        self._checked_at = 0
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @property
+    def check_interval(self):
+        return getattr(settings, "INGREDIENT_INDEX_CHECK_INTERVAL", 5)
+
+    @property
+    def max_age(self):
+        return getattr(settings, "INGREDIENT_INDEX_MAX_AGE", 300)
+
+    def get_version(self):
+        return self.cache.get_or_set(
+            self.version_key, time.time_ns(), timeout=None)
+
+    def invalidate(self):
+        """Сбрасывает индекс текущего процесса"""
+        with self._lock:
+            self._generation += 1
+            self._state = None
+
+    def bump_version(self):
+        """Сбрасывает индекс во всех процессах"""
+        try:
+            self.cache.incr(self.version_key)
+        except ValueError:
+            self.cache.set(self.version_key, time.time_ns(), timeout=None)
+        self.invalidate()
+
+    def _get_state(self, build=True):
+        state = self._state
+        now = time.monotonic()
+        if state is not None and now < state.built_at + self.max_age:
+            if now < self._checked_at + self.check_interval:
+                return state
+            if state.version == self.get_version():
+                self._checked_at = now
+                return state
+        return self._build() if build else None
+
+    def _build(self):
+        with self._lock:
+            generation = self._generation
+        version = self.get_version()
+        ingredients = list(Ingredient.objects.all())
+        keys = sorted(
+            (ingredient.name.casefold(), position)
+            for position, ingredient in enumerate(ingredients)
+        )
+        state = IndexState(
+            ingredients,
+            [key for key, _ in keys],
+            [position for _, position in keys],
+            {ingredient.pk: ingredient for ingredient in ingredients},
+            version,
+            time.monotonic(),
+        )
+        with self._lock:
+            if generation == self._generation:
+                self._state = state
+                self._checked_at = state.built_at
+        return state
+
+    @staticmethod
+    def _prefix_positions(state, prefix):
+        prefix = prefix.casefold()
+        start = bisect_left(state.names, prefix)
+        end = bisect_left(state.names, prefix + chr(0x10FFFF), lo=start)
+        return set(state.positions[start:end])
+
+    def search(self, prefixes):
+        """Ингредиенты, название которых начинается с каждого из префиксов"""
+        state = self._get_state()
+        matched = None
+        for prefix in prefixes:
+            positions = self._prefix_positions(state, prefix)
+            matched = positions if matched is None else matched & positions
+        if matched is None:
+            return list(state.ingredients)
+        return [state.ingredients[position] for position in sorted(matched)]
+
+    def in_bulk(self, ids):
+        """
+        Ингредиенты с указанными ID ({id: ингредиент}), если индекс уже
+        построен и не устарел, иначе None: строить его ради проверки
+        не стоит.
+        """
+        state = self._get_state(build=False)
+        if state is None:
+            return None
+        return {pk: state.by_id[pk] for pk in ids if pk in state.by_id}
+
+
+ingredient_index = IngredientIndex()
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredient_index(**kwargs):
+    ingredient_index.invalidate()
+    transaction.on_commit(ingredient_index.bump_version)
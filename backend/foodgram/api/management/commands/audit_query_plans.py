@@ -0,0 +1,214 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from rest_framework.test import APIRequestFactory
+
+from api.views import RecipeViewSet
+from recipes.constants import SIMILAR_RECIPES_LIMIT
+from recipes.feed import UserFeed
+from recipes.models import Follow, Recipe, ShoppingListItem
+from recipes.similarity import similar_recipes
+
+
+User = get_user_model()
+request_factory = APIRequestFactory()
+
+PAGE_SIZE = 10
+QUERY_SHAPES = {}
+SEQ_SCAN_RE = re.compile(r"Seq Scan on (\w+)")
+
+
+def register_query_shape(name):
+    """Регистрирует форму запроса API для проверки плана выполнения"""
+    def decorator(build_queryset):
+        QUERY_SHAPES[name] = build_queryset
+        return build_queryset
+    return decorator
+
+
+def get_recipe_view(user, action="list", query=None, **kwargs):
+    """
+    RecipeViewSet с запросом GET от имени user: выборки строятся тем
+    же кодом (get_queryset, фильтры, сортировка), что и в API.
+    """
+    view = RecipeViewSet(
+        action_map={"get": action}, args=(), kwargs=kwargs,
+        format_kwarg=None,
+    )
+    request = view.initialize_request(
+        request_factory.get("/api/recipes/", query or {}))
+    request.user = user
+    view.request = request
+    return view
+
+
+def recipe_page(user, query=None):
+    view = get_recipe_view(user, query=query)
+    return view.filter_queryset(view.get_queryset())[:PAGE_SIZE]
+
+
+def sample_ingredient_ids():
+    recipe = Recipe.objects.exclude(ingredient_ids=[]).first()
+    ingredient_ids = recipe.ingredient_ids[:3] if recipe else []
+    return ",".join(map(str, ingredient_ids))
+
+
+@register_query_shape("recipe_list")
+def recipe_list(user):
+    return recipe_page(user)
+
+
+@register_query_shape("recipe_list_by_author")
+def recipe_list_by_author(user):
+    return recipe_page(user, {"author": user.pk})
+
+
+@register_query_shape("recipe_list_favorited")
+def recipe_list_favorited(user):
+    return recipe_page(user, {"is_favorited": 1})
+
+
+@register_query_shape("recipe_list_in_shopping_cart")
+def recipe_list_in_shopping_cart(user):
+    return recipe_page(user, {"is_in_shopping_cart": 1})
+
+
+@register_query_shape("recipe_list_popular")
+def recipe_list_popular(user):
+    return recipe_page(user, {"ordering": "-favorite_count"})
+
+
+@register_query_shape("recipe_search")
+def recipe_search(user):
+    return recipe_page(user, {"search": "пирог"})
+
+
+@register_query_shape("recipe_search_typo")
+def recipe_search_typo(user):
+    return recipe_page(user, {"search": "пирк"})
+
+
+@register_query_shape("recipe_have_ingredients")
+def recipe_have_ingredients(user):
+    return recipe_page(user, {"have_ingredients": sample_ingredient_ids()})
+
+
+@register_query_shape("recipe_have_ingredients_fully_covered")
+def recipe_have_ingredients_fully_covered(user):
+    return recipe_page(user, {
+        "have_ingredients": sample_ingredient_ids(), "fully_covered": 1})
+
+
+@register_query_shape("recipe_feed_pushed")
+def recipe_feed_pushed(user):
+    return UserFeed(user).pushed_positions(PAGE_SIZE + 1)
+
+
+@register_query_shape("recipe_feed_pulled")
+def recipe_feed_pulled(user):
+    return UserFeed(user).pulled_positions(PAGE_SIZE + 1)
+
+
+@register_query_shape("recipe_feed_page")
+def recipe_feed_page(user):
+    # Страница ленты читает найденные рецепты через in_bulk. Для пустой
+    # ленты план строится по любым рецептам: с пустым списком
+    # идентификаторов запрос не выполняется.
+    view = get_recipe_view(user, "feed")
+    recipe_ids = [
+        recipe_id for _, recipe_id in
+        UserFeed(user).positions(PAGE_SIZE + 1)
+    ] or list(Recipe.objects.values_list("pk", flat=True)[:PAGE_SIZE])
+    return view.get_queryset().filter(pk__in=recipe_ids)
+
+
+@register_query_shape("recipe_similar")
+def recipe_similar(user):
+    recipe = Recipe.objects.exclude(ingredient_ids=[]).first()
+    view = get_recipe_view(user, "similar", pk=recipe.pk)
+    return similar_recipes(
+        view.get_queryset(), view.get_object())[:SIMILAR_RECIPES_LIMIT]
+
+
+@register_query_shape("recipe_favorited_by")
+def recipe_favorited_by(user):
+    recipe = Recipe.objects.first()
+    return User.objects.filter(favorite_recipes=recipe)
+
+
+@register_query_shape("subscriptions")
+def subscriptions(user):
+    return User.objects.filter(followers__user=user).order_by("username")[:10]
+
+
+@register_query_shape("followers")
+def followers(user):
+    return Follow.objects.filter(following=user).order_by()
+
+
+@register_query_shape("shopping_list")
+def shopping_list(user):
+    return ShoppingListItem.objects.filter(user=user)
+
+
+class Command(BaseCommand):
+    help = (
+        "Выполняет EXPLAIN для зарегистрированных запросов API и "
+        "сообщает о последовательных сканированиях таблиц. "
+        "Запускать на базе, заполненной тестовыми данными."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user", type=int, dest="user_id",
+            help="ID пользователя, от имени которого строятся запросы.",
+        )
+        parser.add_argument(
+            "--allow-seqscan",
+            action="store_true",
+            help="Не запрещать планировщику последовательное сканирование "
+                 "(по умолчанию оно выключено, чтобы видеть запросы "
+                 "без подходящего индекса даже на маленьких таблицах).",
+        )
+        parser.add_argument(
+            "--verbose-plans", action="store_true",
+            help="Печатать планы выполнения целиком.",
+        )
+
+    def handle(self, *args, user_id=None, allow_seqscan=False,
+               verbose_plans=False, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("Query plan audit requires PostgreSQL.")
+        users = User.objects.order_by("pk")
+        user = users.filter(pk=user_id).first() if user_id else users.first()
+        if user is None:
+            raise CommandError("No users found, seed the database first.")
+        if not Recipe.objects.exists():
+            raise CommandError("No recipes found, seed the database first.")
+
+        problems = {}
+        with transaction.atomic():
+            if not allow_seqscan:
+                with connection.cursor() as cursor:
+                    cursor.execute("SET LOCAL enable_seqscan = off")
+            for name, build_queryset in QUERY_SHAPES.items():
+                plan = build_queryset(user).explain()
+                if verbose_plans:
+                    self.stdout.write(f"{name}:\n{plan}\n")
+                tables = sorted(set(SEQ_SCAN_RE.findall(plan)))
+                if tables:
+                    problems[name] = tables
+                    self.stdout.write(self.style.WARNING(
+                        f"{name}: Seq Scan on {', '.join(tables)}"))
+                else:
+                    self.stdout.write(f"{name}: OK")
+
+        if problems:
+            raise CommandError(
+                f"Sequential scans in {len(problems)} of "
+                f"{len(QUERY_SHAPES)} query shapes."
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"All {len(QUERY_SHAPES)} query shapes use indexes."))
@@ -0,0 +1,96 @@
+import threading
+import time
+from collections import Counter
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * fraction))
+    return sorted_values[index]
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочный тест запущенного сервера: несколько потоков по кругу "
+        "запрашивают указанные адреса. Выводит число запросов в секунду "
+        "и задержки, чтобы сравнить режимы SERVER_MODE=wsgi и asgi."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "urls", nargs="+",
+            help="Полные адреса, например http://localhost/api/recipes/.",
+        )
+        parser.add_argument("--concurrency", type=int, default=32)
+        parser.add_argument(
+            "--duration", type=float, default=10,
+            help="Длительность теста в секундах.",
+        )
+        parser.add_argument(
+            "--token", help="Токен пользователя для авторизованных запросов.")
+        parser.add_argument("--timeout", type=float, default=30)
+
+    def handle(self, *args, urls, concurrency=32, duration=10, token=None,
+               timeout=30, **options):
+        if concurrency < 1:
+            raise CommandError("--concurrency must be positive.")
+        headers = {"Authorization": f"Token {token}"} if token else {}
+        latencies = []
+        statuses = Counter()
+        lock = threading.Lock()
+        deadline = time.monotonic() + duration
+
+        def worker(offset):
+            session = requests.Session()
+            session.headers.update(headers)
+            local_latencies = []
+            local_statuses = Counter()
+            position = offset
+            while time.monotonic() < deadline:
+                url = urls[position % len(urls)]
+                position += 1
+                started = time.perf_counter()
+                try:
+                    response = session.get(
+                        url, timeout=timeout, allow_redirects=False)
+                    local_statuses[response.status_code] += 1
+                except requests.RequestException as error:
+                    local_statuses[type(error).__name__] += 1
+                    continue
+                local_latencies.append(time.perf_counter() - started)
+            with lock:
+                latencies.extend(local_latencies)
+                statuses.update(local_statuses)
+
+        started = time.monotonic()
+        threads = [
+            threading.Thread(target=worker, args=(offset,))
+            for offset in range(concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+
+        latencies.sort()
+        total = sum(statuses.values())
+        self.stdout.write(
+            f"{total} requests in {elapsed:.1f}s, "
+            f"{total / elapsed:.1f} req/s, concurrency {concurrency}"
+        )
+        self.stdout.write(
+            "latency ms: "
+            f"p50 {percentile(latencies, 0.50) * 1000:.1f}, "
+            f"p95 {percentile(latencies, 0.95) * 1000:.1f}, "
+            f"p99 {percentile(latencies, 0.99) * 1000:.1f}, "
+            f"max {percentile(latencies, 1.0) * 1000:.1f}"
+        )
+        self.stdout.write("statuses: " + ", ".join(
+            f"{status}: {count}" for status, count in sorted(
+                statuses.items(), key=lambda item: str(item[0]))
+        ))
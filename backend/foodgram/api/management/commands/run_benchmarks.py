@@ -0,0 +1,360 @@
+import json
+import re
+import statistics
+import subprocess
+import time
+from datetime import datetime, timezone
+
+import requests
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.management.commands.load_test import percentile
+from recipes.models import Ingredient, Recipe
+
+
+User = get_user_model()
+
+SCENARIOS = {}
+SERVER_TIMING_QUERIES_RE = re.compile(r'desc="(\d+) queries"')
+LATENCY_PERCENTILES = (0.50, 0.90, 0.95, 0.99)
+# Параметр с уникальным значением для --cold-cache: фильтры его
+# не используют, а ключ кэша ответов рецептов с ним каждый раз новый.
+CACHE_BUST_PARAM = "benchmark_run"
+
+
+def register_scenario(name, authenticated=False):
+    """Регистрирует эндпоинт, который прогоняет бенчмарк"""
+    def decorator(build_path):
+        SCENARIOS[name] = (build_path, authenticated)
+        return build_path
+    return decorator
+
+
+@register_scenario("recipe_list")
+def recipe_list(data):
+    return "/api/recipes/"
+
+
+@register_scenario("recipe_list_by_author")
+def recipe_list_by_author(data):
+    return f"/api/recipes/?author={data['author_id']}"
+
+
+@register_scenario("recipe_list_favorited", authenticated=True)
+def recipe_list_favorited(data):
+    return "/api/recipes/?is_favorited=1"
+
+
+@register_scenario("recipe_list_in_shopping_cart", authenticated=True)
+def recipe_list_in_shopping_cart(data):
+    return "/api/recipes/?is_in_shopping_cart=1"
+
+
+@register_scenario("recipe_list_search")
+def recipe_list_search(data):
+    return f"/api/recipes/?search={data['search']}"
+
+
+@register_scenario("recipe_list_have_ingredients")
+def recipe_list_have_ingredients(data):
+    return "/api/recipes/?" + "&".join(
+        f"have_ingredients={pk}" for pk in data["ingredient_ids"])
+
+
+@register_scenario("recipe_list_fully_covered")
+def recipe_list_fully_covered(data):
+    return recipe_list_have_ingredients(data) + "&fully_covered=1"
+
+
+@register_scenario("recipe_feed", authenticated=True)
+def recipe_feed(data):
+    return "/api/recipes/feed/"
+
+
+@register_scenario("recipe_detail", authenticated=True)
+def recipe_detail(data):
+    return f"/api/recipes/{data['recipe_id']}/"
+
+
+@register_scenario("recipe_similar")
+def recipe_similar(data):
+    return f"/api/recipes/{data['recipe_id']}/similar/"
+
+
+@register_scenario("subscriptions", authenticated=True)
+def subscriptions(data):
+    return "/api/users/subscriptions/?recipes_limit=3"
+
+
+@register_scenario("ingredient_search")
+def ingredient_search(data):
+    return f"/api/ingredients/?name={data['ingredient_prefix']}"
+
+
+@register_scenario("download_shopping_cart", authenticated=True)
+def download_shopping_cart(data):
+    return "/api/recipes/download_shopping_cart/"
+
+
+def collect_benchmark_data():
+    """
+    Параметры запросов из текущей базы: самый активный пользователь,
+    самый плодовитый автор, популярный рецепт и ингредиенты.
+    """
+    user = User.objects.annotate(
+        favorites=Count("favorite_recipes", distinct=True),
+        follows=Count("following", distinct=True),
+    ).order_by("-favorites", "-follows", "id").first()
+    author = User.objects.annotate(
+        recipes_count=Count("recipes")).order_by("-recipes_count", "id").first()
+    recipe = Recipe.objects.order_by(
+        "-favorite_count", *Recipe._meta.ordering).first()
+    if user is None or recipe is None:
+        raise CommandError(
+            "No recipes to benchmark, run seed_benchmark_data first.")
+    ingredients = list(
+        Ingredient.objects.annotate(uses=Count("recipes"))
+        .order_by("-uses", "id")[:5]
+    )
+    return {
+        "user": user,
+        "author_id": author.id,
+        "recipe_id": recipe.id,
+        "ingredient_ids": [ingredient.id for ingredient in ingredients],
+        "ingredient_prefix": ingredients[0].name[:3],
+        "search": ingredients[0].name.split()[0],
+    }
+
+
+class InProcessClient:
+    """Запросы через тестовый клиент DRF, SQL считается в этом процессе"""
+
+    def __init__(self, token):
+        host = next(
+            (host for host in settings.ALLOWED_HOSTS if "*" not in host),
+            "localhost",
+        )
+        self.anonymous = APIClient(SERVER_NAME=host)
+        self.authenticated = APIClient(SERVER_NAME=host)
+        self.authenticated.credentials(HTTP_AUTHORIZATION=f"Token {token}")
+
+    def get(self, path, authenticated):
+        client = self.authenticated if authenticated else self.anonymous
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(path)
+            if response.streaming:
+                b"".join(response.streaming_content)
+        return response.status_code, len(queries.captured_queries)
+
+
+class HttpClient:
+    """
+    Запросы к запущенному серверу. Число SQL-запросов берется
+    из заголовка Server-Timing, который добавляет MetricsMiddleware;
+    для потоковых ответов в него попадают только запросы до начала
+    отправки тела.
+    """
+
+    def __init__(self, base_url, token, timeout):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.anonymous = requests.Session()
+        self.authenticated = requests.Session()
+        self.authenticated.headers["Authorization"] = f"Token {token}"
+
+    def get(self, path, authenticated):
+        session = self.authenticated if authenticated else self.anonymous
+        response = session.get(
+            self.base_url + path, timeout=self.timeout, allow_redirects=False)
+        match = SERVER_TIMING_QUERIES_RE.search(
+            response.headers.get("Server-Timing", ""))
+        return response.status_code, int(match[1]) if match else None
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Прогоняет основные эндпоинты API и сохраняет пропускную "
+        "способность, перцентили задержек и число SQL-запросов в JSON, "
+        "чтобы сравнивать результаты между коммитами. По умолчанию "
+        "запросы выполняются в процессе через тестовый клиент DRF, "
+        "с --url отправляются на запущенный сервер."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "scenarios", nargs="*",
+            help="Сценарии для запуска, по умолчанию все: "
+                 + ", ".join(SCENARIOS) + ".",
+        )
+        parser.add_argument(
+            "--url", help="Адрес сервера, например http://localhost:8000.")
+        parser.add_argument(
+            "--requests", type=int, default=50, dest="request_count")
+        parser.add_argument("--warmup", type=int, default=5)
+        parser.add_argument("--timeout", type=float, default=30)
+        parser.add_argument(
+            "--output", help="Файл для результатов в формате JSON.")
+        parser.add_argument(
+            "--compare", help="JSON предыдущего прогона для сравнения.")
+        parser.add_argument(
+            "--max-regression", type=float, default=25,
+            help="Допустимый рост p95 в процентах при сравнении.",
+        )
+        parser.add_argument(
+            "--cold-cache", action="store_true",
+            help="Не попадать в кэш ответов рецептов: каждый запрос "
+                 "получает уникальный параметр " + CACHE_BUST_PARAM + ".",
+        )
+
+    def handle(self, *args, scenarios, url=None, request_count=50, warmup=5,
+               timeout=30, output=None, compare=None, max_regression=25,
+               cold_cache=False, **options):
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(
+                f"Unknown scenarios: {', '.join(sorted(unknown))}.")
+        if request_count < 1:
+            raise CommandError("--requests must be positive.")
+        baseline = None
+        if compare:
+            with open(compare, encoding="utf-8") as file:
+                baseline = json.load(file)
+
+        self.cold_cache = cold_cache
+        self.run_id = time.time_ns()
+        self.request_number = 0
+        data = collect_benchmark_data()
+        token, _ = Token.objects.get_or_create(user=data["user"])
+        client = (HttpClient(url, token.key, timeout) if url
+                  else InProcessClient(token.key))
+        results = {}
+        for name in scenarios or SCENARIOS:
+            build_path, authenticated = SCENARIOS[name]
+            results[name] = self.run_scenario(
+                client, build_path(data), authenticated, request_count,
+                warmup)
+            self.report(name, results[name])
+
+        report = {
+            "commit": current_commit(),
+            "created": datetime.now(timezone.utc).isoformat(),
+            "mode": "http" if url else "in-process",
+            "url": url,
+            "requests": request_count,
+            "cold_cache": cold_cache,
+            "dataset": {
+                "users": User.objects.count(),
+                "recipes": Recipe.objects.count(),
+                "ingredients": Ingredient.objects.count(),
+            },
+            "scenarios": results,
+        }
+        if output:
+            with open(output, "w", encoding="utf-8") as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+            self.stdout.write(f"Results saved to {output}.")
+        if baseline is not None:
+            self.compare(baseline, report, max_regression)
+
+    def request_path(self, path):
+        if not self.cold_cache:
+            return path
+        self.request_number += 1
+        separator = "&" if "?" in path else "?"
+        return (f"{path}{separator}{CACHE_BUST_PARAM}="
+                f"{self.run_id}-{self.request_number}")
+
+    def run_scenario(self, client, path, authenticated, count, warmup):
+        for _ in range(warmup):
+            client.get(self.request_path(path), authenticated)
+        latencies = []
+        query_counts = []
+        statuses = {}
+        started = time.perf_counter()
+        for _ in range(count):
+            request_path = self.request_path(path)
+            request_started = time.perf_counter()
+            status, queries = client.get(request_path, authenticated)
+            latencies.append(time.perf_counter() - request_started)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+            if queries is not None:
+                query_counts.append(queries)
+        elapsed = time.perf_counter() - started
+        latencies.sort()
+        latency_ms = {
+            f"p{round(fraction * 100)}": percentile(latencies, fraction) * 1000
+            for fraction in LATENCY_PERCENTILES
+        }
+        latency_ms["mean"] = statistics.mean(latencies) * 1000
+        latency_ms["max"] = latencies[-1] * 1000
+        return {
+            "path": path,
+            "statuses": statuses,
+            "throughput": count / elapsed,
+            "latency_ms": {
+                key: round(value, 2) for key, value in latency_ms.items()},
+            "queries": {
+                "mean": statistics.mean(query_counts),
+                "max": max(query_counts),
+            } if query_counts else None,
+        }
+
+    def report(self, name, result):
+        queries = result["queries"]
+        self.stdout.write(
+            f"{name:32} {result['throughput']:8.1f} req/s  "
+            f"p50 {result['latency_ms']['p50']:8.1f} ms  "
+            f"p95 {result['latency_ms']['p95']:8.1f} ms  "
+            f"queries {queries['max'] if queries else '-':>3}  "
+            + ", ".join(f"{status}: {count}"
+                        for status, count in result["statuses"].items())
+        )
+
+    def compare(self, baseline, report, max_regression):
+        """Сравнивает p95 и число запросов с предыдущим прогоном"""
+        self.stdout.write(
+            f"Compared with {baseline.get('commit') or 'baseline'}:")
+        if baseline.get("cold_cache", False) != report["cold_cache"]:
+            raise CommandError(
+                "Cannot compare runs with and without --cold-cache.")
+        regressions = []
+        for name, result in report["scenarios"].items():
+            previous = baseline.get("scenarios", {}).get(name)
+            if previous is None:
+                continue
+            old_p95 = previous["latency_ms"]["p95"]
+            new_p95 = result["latency_ms"]["p95"]
+            change = (new_p95 - old_p95) / old_p95 * 100 if old_p95 else 0
+            old_queries = (previous.get("queries") or {}).get("max")
+            new_queries = (result.get("queries") or {}).get("max")
+            line = (
+                f"{name:32} p95 {old_p95:8.1f} -> {new_p95:8.1f} ms "
+                f"({change:+.0f}%)  queries {old_queries} -> {new_queries}"
+            )
+            if change > max_regression or (
+                old_queries is not None and new_queries is not None
+                and new_queries > old_queries
+            ):
+                regressions.append(name)
+                line = self.style.ERROR(line)
+            self.stdout.write(line)
+        if regressions:
+            raise CommandError(
+                f"Regressions in: {', '.join(regressions)}.")
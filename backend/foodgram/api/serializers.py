@@ -1,14 +1,26 @@
+from collections import Counter
+
 from recipes.models import Follow, Recipe, Ingredient, RecipeIngredient
+from recipes.shopping_list import update_shopping_lists_for_recipe
 from rest_framework import serializers
+from django.db import transaction
+from django.db.models import prefetch_related_objects
 from django.contrib.auth import get_user_model
 from djoser.serializers import UserCreateSerializer, UserSerializer
-import base64
-from django.core.files.base import ContentFile
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.files.storage import default_storage
+from recipes.images import validate_image
+from recipes.ingredient_match import set_recipe_ingredient_ids
+from recipes.feed import fan_out_recipe
+from recipes.similarity import refresh_similarity_buckets
+from .utils import decode_base64_image, parse_recipes_limit
+from .ingredient_index import ingredient_index
 from recipes.constants import (
     MIN_COOKING_TIME,
     MAX_COOKING_TIME,
     MAX_INGREDIENT_AMOUNT,
-    MIN_INGREDIENT_AMOUNT
+    MIN_INGREDIENT_AMOUNT,
+    THUMBNAIL_SIZES,
 )
 
 User = get_user_model()
@@ -16,24 +28,101 @@ User = get_user_model()
 
 class Base64ImageField(serializers.ImageField):
     def to_internal_value(self, data):
-        if isinstance(data, str) and data.startswith("data:image"):
-            format, imgstr = data.split(";base64,")
-            ext = format.split("/")[-1]
-            data = ContentFile(base64.b64decode(imgstr), name="temp." + ext)
+        try:
+            if isinstance(data, str) and data.startswith("data:image"):
+                data = decode_base64_image(data)
+            if hasattr(data, "read"):
+                validate_image(data)
+        except DjangoValidationError as error:
+            raise serializers.ValidationError(error.messages)
 
         return super().to_internal_value(data)
 
 
+def get_media_url(name, request):
+    url = default_storage.url(name)
+    if request is not None:
+        url = request.build_absolute_uri(url)
+    return url
+
+
+class ThumbnailsField(serializers.ReadOnlyField):
+    """Ссылки на уменьшенные копии картинки: {размер: {формат: url}}"""
+
+    def to_representation(self, thumbnails):
+        request = self.context.get("request")
+        urls = {}
+        for size_name in THUMBNAIL_SIZES:
+            if size_name not in thumbnails:
+                continue
+            urls[size_name] = {
+                image_format: get_media_url(name, request)
+                for image_format, name in thumbnails[size_name].items()
+            }
+        return urls
+
+
+class ThumbnailImageField(Base64ImageField):
+    """
+    Картинка рецепта в списках: ссылка на JPEG-миниатюру размера
+    size_name. Пока миниатюры не готовы, отдается исходный файл.
+    """
+
+    def __init__(self, size_name, **kwargs):
+        self.size_name = size_name
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        thumbnails = value.instance.thumbnails if value else {}
+        name = None
+        if thumbnails.get("source") == value.name:
+            name = thumbnails.get(self.size_name, {}).get("jpeg")
+        if name is None:
+            return super().to_representation(value)
+        return get_media_url(name, self.context.get("request"))
+
+
 class IngredientSerializer(serializers.ModelSerializer):
     class Meta:
         model = Ingredient
         fields = ("id", "name", "measurement_unit")
 
 
+class IngredientIdField(serializers.IntegerField):
+    """
+    ID ингредиента в составе рецепта. Объекты ингредиентов для всего
+    списка загружает RecipeIngredientListSerializer.
+    """
+
+    def to_representation(self, value):
+        return value.pk
+
+
+class RecipeIngredientListSerializer(serializers.ListSerializer):
+    """
+    Состав рецепта. Ингредиенты всех позиций загружаются одним запросом
+    или берутся из индекса ингредиентов, если он уже построен;
+    все несуществующие ID попадают в одну ошибку.
+    """
+
+    def to_internal_value(self, data):
+        items = super().to_internal_value(data)
+        ingredient_ids = {item["ingredient"] for item in items}
+        ingredients = ingredient_index.in_bulk(ingredient_ids)
+        if ingredients is None:
+            ingredients = Ingredient.objects.in_bulk(ingredient_ids)
+        missing = sorted(ingredient_ids - ingredients.keys())
+        if missing:
+            missing_ids = ", ".join(map(str, missing))
+            raise serializers.ValidationError(
+                [f"Ingredients with IDs {missing_ids} do not exist."])
+        for item in items:
+            item["ingredient"] = ingredients[item["ingredient"]]
+        return items
+
+
 class RecipeIngredientSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all(), source="ingredient"
-    )
+    id = IngredientIdField(min_value=1, source="ingredient")
     name = serializers.CharField(source="ingredient.name", read_only=True)
     measurement_unit = serializers.CharField(
         source="ingredient.measurement_unit", read_only=True
@@ -44,6 +133,7 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
     class Meta:
         model = RecipeIngredient
         fields = ("id", "name", "measurement_unit", "amount")
+        list_serializer_class = RecipeIngredientListSerializer
 
 
 class CustomUserCreateSerializer(UserCreateSerializer):
@@ -73,13 +163,18 @@ class CustomUserSerializer(UserSerializer):
         request = self.context.get("request")
         if not request or not request.user.is_authenticated:
             return False
+        if hasattr(obj, "subscribed"):
+            return obj.subscribed
         return request.user.following.filter(following=obj).exists()
 
 
 class RecipeMinifiedSerializer(serializers.ModelSerializer):
+    image = ThumbnailImageField("small", read_only=True)
+    thumbnails = ThumbnailsField()
+
     class Meta:
         model = Recipe
-        fields = ("id", "name", "image", "cooking_time")
+        fields = ("id", "name", "image", "thumbnails", "cooking_time")
 
 
 class CustomUserWithRecipesSerializer(CustomUserSerializer):
@@ -91,19 +186,19 @@ class CustomUserWithRecipesSerializer(CustomUserSerializer):
             ("recipes", "recipes_count")
 
     def get_recipes(self, obj):
-        recipes_limit = self.context.get(
-            "request").query_params.get("recipes_limit")
-        recipes = obj.recipes.all()
-        if recipes_limit:
-            try:
-                recipes_limit = int(recipes_limit)
-                if recipes_limit > 0:
-                    recipes = recipes[:recipes_limit]
-            except (ValueError, TypeError):
-                pass
+        if hasattr(obj, "limited_recipes"):
+            recipes = obj.limited_recipes
+        else:
+            recipes = obj.recipes.all()
+            recipes_limit = parse_recipes_limit(
+                self.context.get("request").query_params)
+            if recipes_limit:
+                recipes = recipes[:recipes_limit]
         return RecipeMinifiedSerializer(recipes, many=True).data
 
     def get_recipes_count(self, obj):
+        if hasattr(obj, "recipes_count"):
+            return obj.recipes_count
         return obj.recipes.count()
 
 
@@ -118,6 +213,7 @@ class UserAvatarSerializer(serializers.ModelSerializer):
 class RecipeSerializer(serializers.ModelSerializer):
     author = CustomUserSerializer(read_only=True)
     image = Base64ImageField()
+    thumbnails = ThumbnailsField()
     ingredients = RecipeIngredientSerializer(many=True,
                                              source="ingredient_amounts")
     cooking_time = serializers.IntegerField(max_value=MAX_COOKING_TIME,
@@ -132,6 +228,7 @@ class RecipeSerializer(serializers.ModelSerializer):
             "author",
             "name",
             "image",
+            "thumbnails",
             "text",
             "cooking_time",
             "ingredients",
@@ -140,17 +237,29 @@ class RecipeSerializer(serializers.ModelSerializer):
         )
         read_only_fileds = ("author", "is_favorited", "is_in_shopping_cart")
 
+    def to_representation(self, instance):
+        # После создания или изменения рецепта состав не загружен
+        # заранее: без этого каждый ингредиент читался бы отдельно.
+        if "ingredient_amounts" not in getattr(
+            instance, "_prefetched_objects_cache", {}
+        ):
+            prefetch_related_objects(
+                [instance], "ingredient_amounts__ingredient")
+        return super().to_representation(instance)
+
     def get_is_favorited(self, obj):
-        request = self.context.get("request")
-        if not request or not request.user.is_authenticated:
-            return False
-        return request.user.favorite_recipes.filter(id=obj.id).exists()
+        return self._get_user_flag(obj, "favorited", "favorite_recipes")
 
     def get_is_in_shopping_cart(self, obj):
+        return self._get_user_flag(obj, "in_shopping_cart", "shopping_cart")
+
+    def _get_user_flag(self, obj, annotation_name, relation_name):
         request = self.context.get("request")
         if not request or not request.user.is_authenticated:
             return False
-        return request.user.shopping_cart.filter(id=obj.id).exists()
+        if hasattr(obj, annotation_name):
+            return getattr(obj, annotation_name)
+        return getattr(request.user, relation_name).filter(id=obj.id).exists()
 
     def validate(self, data):
         if "ingredient_amounts" in data and data["ingredient_amounts"]:
@@ -189,19 +298,107 @@ class RecipeSerializer(serializers.ModelSerializer):
             for ingredient_data in ingredients
         ]
         RecipeIngredient.objects.bulk_create(ingredient_objects)
+        set_recipe_ingredient_ids(
+            recipe,
+            [ingredient_data["ingredient"].id
+             for ingredient_data in ingredients],
+        )
+        refresh_similarity_buckets([recipe.pk])
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop("ingredient_amounts")
         recipe = Recipe.objects.create(**validated_data)
         self.create_ingredients(recipe, ingredients)
+        fan_out_recipe(recipe)
         return recipe
 
+    def update_ingredients(self, recipe, ingredients):
+        """
+        Приводит состав рецепта к ingredients: меняет количество
+        у оставшихся ингредиентов, удаляет убранные и добавляет новые,
+        не трогая строки без изменений. Возвращает прежние количества
+        или None, если состав не изменился.
+        """
+        existing = {
+            item.ingredient_id: item
+            for item in RecipeIngredient.objects.filter(recipe=recipe)
+        }
+        old_amounts = Counter({
+            ingredient_id: item.amount
+            for ingredient_id, item in existing.items()
+        })
+        new_amounts = {
+            ingredient_data["ingredient"].id: ingredient_data["amount"]
+            for ingredient_data in ingredients
+        }
+        changed = []
+        for ingredient_id, amount in new_amounts.items():
+            item = existing.get(ingredient_id)
+            if item is not None and item.amount != amount:
+                item.amount = amount
+                changed.append(item)
+        removed = [
+            item.pk for ingredient_id, item in existing.items()
+            if ingredient_id not in new_amounts
+        ]
+        added = [
+            RecipeIngredient(
+                recipe=recipe,
+                ingredient=ingredient_data["ingredient"],
+                amount=ingredient_data["amount"]
+            )
+            for ingredient_data in ingredients
+            if ingredient_data["ingredient"].id not in existing
+        ]
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ["amount"])
+        if removed:
+            # Удаление без сигналов, как bulk_update и bulk_create:
+            # обработчики строк состава пересчитали бы списки покупок
+            # и остальные производные данные, которые обновляются ниже
+            # и в update() один раз для всего рецепта.
+            removed_rows = RecipeIngredient.objects.filter(pk__in=removed)
+            removed_rows._raw_delete(removed_rows.db)
+        if added:
+            RecipeIngredient.objects.bulk_create(added)
+        if removed or added:
+            set_recipe_ingredient_ids(recipe, new_amounts)
+            refresh_similarity_buckets([recipe.pk])
+        if not (changed or removed or added):
+            return None
+        return old_amounts
+
+    @transaction.atomic
     def update(self, instance, validated_data):
         ingredients = validated_data.pop("ingredient_amounts", None)
+        # Сохраняются только поля из запроса: счетчики, миниатюры
+        # и признак рассылки меняются в обход сериализатора, и полное
+        # сохранение вернуло бы их прочитанные значения.
+        update_fields = list(validated_data)
         if ingredients:
-            instance.ingredient_amounts.all().delete()
-            self.create_ingredients(instance, ingredients)
-        return super().update(instance, validated_data)
+            # Состав читается под блокировкой рецепта, иначе параллельная
+            # правка посчитала бы разницу для списков покупок
+            # от устаревшего состава.
+            list(Recipe.objects.select_for_update().filter(
+                pk=instance.pk).values_list("pk", flat=True))
+            old_amounts = self.update_ingredients(instance, ingredients)
+            if old_amounts is not None:
+                update_shopping_lists_for_recipe(instance, old_amounts)
+                # Строки состава пишутся пакетно, без сигналов; по
+                # ingredient_ids обработчики post_save рецепта узнают,
+                # что состав изменился.
+                update_fields.append("ingredient_ids")
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=update_fields)
+        return instance
+
+
+class RecipeListSerializer(RecipeSerializer):
+    """Рецепт в списках: вместо исходной картинки - миниатюра"""
+
+    image = ThumbnailImageField("medium", read_only=True)
 
 
 class FollowSerializer(serializers.ModelSerializer):
@@ -0,0 +1,101 @@
+import csv
+import json
+from abc import ABC, abstractmethod
+
+from recipes.models import ShoppingListItem
+
+
+SHOPPING_CART_CHUNK_SIZE = 500
+SHOPPING_CART_RENDERERS = {}
+
+
+def register_renderer(renderer_class):
+    """Регистрирует формат выгрузки списка покупок по его имени"""
+    SHOPPING_CART_RENDERERS[renderer_class.format] = renderer_class
+    return renderer_class
+
+
+def get_shopping_cart_ingredients(user):
+    """
+    Суммарное количество каждого ингредиента в рецептах из корзины
+    из готового списка покупок пользователя. Строки читаются курсором
+    на стороне сервера частями по SHOPPING_CART_CHUNK_SIZE.
+    """
+    return (
+        ShoppingListItem.objects.filter(user=user)
+        .values("ingredient__name", "ingredient__measurement_unit",
+                "total_amount")
+        .order_by("ingredient__name")
+        .iterator(chunk_size=SHOPPING_CART_CHUNK_SIZE)
+    )
+
+
+class ShoppingCartRenderer(ABC):
+    """
+    Базовый формат выгрузки. Наследники задают format, content_type
+    и отдают файл по частям в render().
+    """
+
+    format = None
+    content_type = None
+
+    @property
+    def filename(self):
+        return f"shopping_cart.{self.format}"
+
+    @abstractmethod
+    def render(self, ingredients):
+        """Части файла со списком ingredients"""
+
+
+@register_renderer
+class TextShoppingCartRenderer(ShoppingCartRenderer):
+    format = "txt"
+    content_type = "text/plain"
+
+    def render(self, ingredients):
+        for i, ingredient in enumerate(ingredients):
+            yield (
+                f'{i+1}. '
+                f'{ingredient["ingredient__name"].title()} '
+                f'({ingredient["ingredient__measurement_unit"]})'
+                f' — {ingredient["total_amount"]}\n'
+            )
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+@register_renderer
+class CSVShoppingCartRenderer(ShoppingCartRenderer):
+    format = "csv"
+    content_type = "text/csv"
+
+    def render(self, ingredients):
+        writer = csv.writer(_Echo())
+        yield writer.writerow(("name", "measurement_unit", "amount"))
+        for ingredient in ingredients:
+            yield writer.writerow((
+                ingredient["ingredient__name"],
+                ingredient["ingredient__measurement_unit"],
+                ingredient["total_amount"],
+            ))
+
+
+@register_renderer
+class JSONShoppingCartRenderer(ShoppingCartRenderer):
+    format = "json"
+    content_type = "application/json"
+
+    def render(self, ingredients):
+        separator = "["
+        for ingredient in ingredients:
+            yield separator + json.dumps({
+                "name": ingredient["ingredient__name"],
+                "measurement_unit": ingredient["ingredient__measurement_unit"],
+                "amount": ingredient["total_amount"],
+            }, ensure_ascii=False)
+            separator = ","
+        yield "[]" if separator == "[" else "]"
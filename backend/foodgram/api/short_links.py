@@ -0,0 +1,68 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from recipes.models import Recipe
+
+
+class ShortLinkCache:
+    """
+    Кэш существования рецептов для коротких ссылок.
+
+    Для каждого проверенного ID хранится True (рецепт есть) или False.
+    При удалении рецепта сигнал записывает False (надгробие), поэтому
+    устаревшие ссылки получают 404 без запроса к базе. Отсутствующие
+    ID после первой проверки тоже отвечают из кэша, но недолго: рецепты,
+    созданные без сигналов (bulk_create), станут доступны после
+    истечения miss_timeout.
+    """
+
+    prefix = "short-link"
+    # Секунды, на которые запоминается ID, не найденный в базе.
+    miss_timeout = 60
+
+    def __init__(self, alias="default"):
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @property
+    def timeout(self):
+        return getattr(settings, "SHORT_LINK_CACHE_TIMEOUT", 24 * 60 * 60)
+
+    def _key(self, recipe_id):
+        return f"{self.prefix}:{recipe_id}"
+
+    def set(self, recipe_id, exists, timeout=None):
+        self.cache.set(
+            self._key(recipe_id), exists,
+            self.timeout if timeout is None else timeout,
+        )
+
+    def recipe_exists(self, recipe_id):
+        exists = self.cache.get(self._key(recipe_id))
+        if exists is None:
+            exists = Recipe.objects.filter(pk=recipe_id).exists()
+            self.set(recipe_id, exists,
+                     None if exists else self.miss_timeout)
+        return exists
+
+
+short_link_cache = ShortLinkCache()
+
+
+@receiver(post_save, sender=Recipe)
+def remember_recipe_for_short_links(instance, created, **kwargs):
+    if created:
+        recipe_id = instance.pk
+        transaction.on_commit(lambda: short_link_cache.set(recipe_id, True))
+
+
+@receiver(post_delete, sender=Recipe)
+def bury_recipe_for_short_links(instance, **kwargs):
+    # После удаления Django обнуляет pk, поэтому ID запоминается сразу.
+    recipe_id = instance.pk
+    transaction.on_commit(lambda: short_link_cache.set(recipe_id, False))
@@ -0,0 +1,46 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient
+
+
+User = get_user_model()
+
+
+class APITestCase(TestCase):
+    """Тесты API: чистый кэш и клиент с авторизованным пользователем"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = self.create_user("reader")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    @staticmethod
+    def create_user(username):
+        return User.objects.create_user(
+            username=username, email=f"{username}@example.com",
+            password="Secret-123", first_name=username, last_name=username,
+        )
+
+    @staticmethod
+    def create_ingredients(count):
+        return Ingredient.objects.bulk_create(
+            Ingredient(name=f"ingredient {number}", measurement_unit="g")
+            for number in range(count)
+        )
+
+    @staticmethod
+    def create_recipe(author, ingredients, name="recipe"):
+        recipe = Recipe.objects.create(
+            author=author, name=name, text="text", cooking_time=10,
+            image="recipes/test.png",
+            ingredient_ids=sorted(ingredient.pk for ingredient in ingredients),
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=100)
+            for ingredient in ingredients
+        )
+        return recipe
@@ -0,0 +1,32 @@
+import base64
+import os
+import tracemalloc
+
+from django.test import SimpleTestCase
+
+from api.utils import BASE64_CHUNK_SIZE, decode_base64_image
+
+PAYLOAD_SIZE = 8 * 1024 * 1024
+# Декодирование идет частями, а файл больше FILE_UPLOAD_MAX_MEMORY_SIZE
+# пишется на диск: пик памяти не зависит от размера картинки.
+PEAK_MEMORY_LIMIT = 16 * BASE64_CHUNK_SIZE
+
+
+class DecodeBase64ImageMemoryTest(SimpleTestCase):
+    def test_large_payload_is_decoded_in_bounded_memory(self):
+        payload = b"\x89PNG\r\n\x1a\n" + os.urandom(PAYLOAD_SIZE)
+        data = (
+            "data:image/png;base64," + base64.b64encode(payload).decode()
+        )
+        tracemalloc.start()
+        try:
+            upload = decode_base64_image(data)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        try:
+            self.assertEqual(upload.size, len(payload))
+            self.assertEqual(upload.read(len(payload) + 1), payload)
+        finally:
+            upload.close()
+        self.assertLess(peak, PEAK_MEMORY_LIMIT)
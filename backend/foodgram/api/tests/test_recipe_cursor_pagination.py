@@ -0,0 +1,36 @@
+from .base import APITestCase
+
+
+class RecipeCursorPaginationTest(APITestCase):
+    """Пагинация рецептов по ключу: ?pagination=cursor"""
+
+    def setUp(self):
+        super().setUp()
+        ingredients = self.create_ingredients(2)
+        self.recipes = [
+            self.create_recipe(self.user, ingredients, name=f"recipe {number}")
+            for number in range(5)
+        ]
+
+    def get_names(self, query):
+        names = []
+        url = f"/api/recipes/?pagination=cursor&limit=2&{query}"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.data)
+            names += [recipe["name"] for recipe in response.data["results"]]
+            url = response.data["next"]
+        return names
+
+    def test_invalid_ordering_falls_back_to_default(self):
+        expected = [recipe.name for recipe in reversed(self.recipes)]
+        for query in ("ordering=bogus", "ordering=", "ordering=-pub_date"):
+            with self.subTest(query=query):
+                self.assertEqual(self.get_names(query), expected)
+
+    def test_ranked_filters_are_rejected(self):
+        for query in ("search=recipe", "have_ingredients=1"):
+            with self.subTest(query=query):
+                response = self.client.get(
+                    f"/api/recipes/?pagination=cursor&{query}")
+                self.assertEqual(response.status_code, 400)
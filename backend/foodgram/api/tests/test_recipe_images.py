@@ -0,0 +1,35 @@
+from recipes.models import Recipe
+
+from .base import APITestCase
+
+
+class RecipeListImageTest(APITestCase):
+    """В списках поле image ссылается на миниатюру, если она готова"""
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = self.create_recipe(
+            self.user, self.create_ingredients(1))
+
+    def get_images(self):
+        listed = self.client.get("/api/recipes/").data["results"][0]
+        detail = self.client.get(f"/api/recipes/{self.recipe.pk}/").data
+        return listed["image"], detail["image"]
+
+    def test_original_image_until_thumbnails_are_ready(self):
+        listed, detail = self.get_images()
+        self.assertTrue(listed.endswith("/media/recipes/test.png"))
+        self.assertEqual(listed, detail)
+
+    def test_list_uses_thumbnail(self):
+        Recipe.objects.filter(pk=self.recipe.pk).update(thumbnails={
+            "source": "recipes/test.png",
+            "medium": {
+                "webp": "recipes/thumbnails/test_medium.webp",
+                "jpeg": "recipes/thumbnails/test_medium.jpeg",
+            },
+        })
+        listed, detail = self.get_images()
+        self.assertTrue(
+            listed.endswith("/media/recipes/thumbnails/test_medium.jpeg"))
+        self.assertTrue(detail.endswith("/media/recipes/test.png"))
@@ -0,0 +1,60 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from .base import APITestCase
+
+
+# Запросы страницы списка рецептов. Флаги избранного, корзины
+# и подписки приходят аннотациями, поэтому число запросов не зависит
+# от размера страницы.
+AUTHENTICATED_LIST_QUERIES = 5
+ANONYMOUS_LIST_QUERIES = 4
+
+
+class RecipeListQueryCountTest(APITestCase):
+    """Число запросов страницы рецептов не зависит от ее размера"""
+
+    def setUp(self):
+        super().setUp()
+        ingredients = self.create_ingredients(5)
+        authors = [self.create_user(f"author{number}") for number in range(5)]
+        for number in range(12):
+            recipe = self.create_recipe(
+                authors[number % len(authors)], ingredients[:number % 5 + 1],
+                name=f"recipe {number}",
+            )
+            if number % 2:
+                self.user.favorite_recipes.add(recipe)
+            if number % 3:
+                self.user.shopping_cart.add(recipe)
+        self.user.following.create(following=authors[0])
+
+    def get_list(self, client, limit):
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(f"/api/recipes/?limit={limit}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["results"]), limit)
+        return response, len(queries)
+
+    def test_authenticated_list(self):
+        _, small_page = self.get_list(self.client, 2)
+        response, large_page = self.get_list(self.client, 10)
+        self.assertEqual(small_page, large_page)
+        self.assertLessEqual(large_page, AUTHENTICATED_LIST_QUERIES)
+        flags = {
+            recipe["name"]: (
+                recipe["is_favorited"], recipe["is_in_shopping_cart"],
+                recipe["author"]["is_subscribed"],
+            )
+            for recipe in response.data["results"]
+        }
+        self.assertEqual(flags["recipe 5"], (True, True, True))
+        self.assertEqual(flags["recipe 6"], (False, False, False))
+
+    def test_anonymous_list(self):
+        client = APIClient()
+        _, small_page = self.get_list(client, 2)
+        _, large_page = self.get_list(client, 10)
+        self.assertEqual(small_page, large_page)
+        self.assertLessEqual(large_page, ANONYMOUS_LIST_QUERIES)
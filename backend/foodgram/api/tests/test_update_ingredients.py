@@ -0,0 +1,102 @@
+import re
+from collections import Counter
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import RecipeIngredient, ShoppingListItem
+from recipes.shopping_list import (
+    compute_shopping_lists,
+    get_stored_shopping_lists,
+)
+
+from .base import APITestCase
+
+
+class UpdateIngredientsWritesTest(APITestCase):
+    """
+    Изменение состава рецепта пишет только отличающиеся строки:
+    одно UPDATE, одно INSERT и одно DELETE на весь состав и столько же
+    на списки покупок всех, у кого рецепт в корзине.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.ingredients = self.create_ingredients(5)
+        self.recipe = self.create_recipe(self.user, self.ingredients[:4])
+        self.rows = dict(
+            RecipeIngredient.objects.filter(recipe=self.recipe)
+            .values_list("ingredient_id", "pk")
+        )
+        self.customers = [self.user, self.create_user("customer")]
+        for customer in self.customers:
+            customer.shopping_cart.add(self.recipe)
+
+    def patch_recipe(self, payload):
+        # Отложенные до коммита пересчеты тоже попадают в подсчет.
+        with CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.patch(
+                    f"/api/recipes/{self.recipe.pk}/", payload,
+                    format="json")
+        self.assertEqual(response.status_code, 200, response.data)
+        return queries
+
+    def count_writes(self, queries, model):
+        # Таблица в подзапросе (например, при пересчете search_vector)
+        # записью в нее не считается.
+        pattern = re.compile(
+            rf'^(UPDATE|INSERT INTO|DELETE FROM) "{model._meta.db_table}"'
+        )
+        writes = Counter()
+        for query in queries:
+            match = pattern.match(query["sql"])
+            if match:
+                writes[match.group(1).split()[0]] += 1
+        return writes
+
+    def test_change_add_and_remove_one_ingredient(self):
+        first, second, third, removed, added = self.ingredients
+        payload = {
+            "ingredients": [
+                {"id": first.id, "amount": 250},
+                {"id": second.id, "amount": 100},
+                {"id": third.id, "amount": 100},
+                {"id": added.id, "amount": 5},
+            ],
+        }
+        queries = self.patch_recipe(payload)
+        for model in (RecipeIngredient, ShoppingListItem):
+            self.assertEqual(
+                self.count_writes(queries, model),
+                Counter({"UPDATE": 1, "INSERT": 1, "DELETE": 1}),
+                model.__name__,
+            )
+        rows = {
+            item.ingredient_id: item
+            for item in RecipeIngredient.objects.filter(recipe=self.recipe)
+        }
+        amounts = {
+            ingredient_id: item.amount for ingredient_id, item in rows.items()
+        }
+        self.assertEqual(
+            amounts,
+            {first.id: 250, second.id: 100, third.id: 100, added.id: 5},
+        )
+        # Строки без изменений остаются на месте.
+        for ingredient in (first, second, third):
+            self.assertEqual(rows[ingredient.id].pk, self.rows[ingredient.id])
+        user_ids = [customer.pk for customer in self.customers]
+        self.assertEqual(get_stored_shopping_lists(user_ids),
+                         compute_shopping_lists(user_ids))
+
+    def test_unchanged_ingredients_are_not_written(self):
+        payload = {
+            "ingredients": [
+                {"id": ingredient.id, "amount": 100}
+                for ingredient in self.ingredients[:4]
+            ],
+        }
+        queries = self.patch_recipe(payload)
+        for model in (RecipeIngredient, ShoppingListItem):
+            self.assertEqual(self.count_writes(queries, model), Counter())
@@ -1,6 +1,8 @@
 from rest_framework.routers import DefaultRouter
 from .views import IngredientViewSet, RecipeViewSet
+from django.conf import settings
 from django.urls import include, path
+from .async_views import async_read_view
 from .views import CustomUserViewSet
 
 
@@ -9,8 +11,23 @@ router.register("ingredients", IngredientViewSet, basename="ingredient")
 router.register("recipes", RecipeViewSet, basename="recipe")
 router.register("users", CustomUserViewSet, basename="user")
 
+# Маршруты, которые в режиме ASGI обслуживаются асинхронно.
+ASYNC_ROUTES = (
+    "ingredient-list",
+    "ingredient-detail",
+    "recipe-list",
+    "recipe-detail",
+    "recipe-download-shopping-cart",
+)
+
+router_urls = router.urls
+if settings.SERVER_MODE == "asgi":
+    for pattern in router_urls:
+        if pattern.name in ASYNC_ROUTES:
+            pattern.callback = async_read_view(pattern.callback)
+
 urlpatterns = [
-    path("", include(router.urls)),
+    path("", include(router_urls)),
     path("", include("djoser.urls")),
     path("auth/", include("djoser.urls.authtoken")),
 ]
@@ -1,8 +1,22 @@
+import base64
+import binascii
 import string
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import (
+    InMemoryUploadedFile,
+    TemporaryUploadedFile,
+)
+from recipes.constants import MAX_IMAGE_UPLOAD_SIZE
 
 
 BASE62_ALPHABET = string.digits + string.ascii_letters
 BASE62_LENGTH = len(BASE62_ALPHABET)
+BASE62_INDEX = {char: value for value, char in enumerate(BASE62_ALPHABET)}
+# Самый большой ID модели с BigAutoField.
+MAX_ID = 2 ** 63 - 1
 
 
 def encode_id_to_base62(pk: int) -> str:
@@ -18,9 +32,102 @@ def encode_id_to_base62(pk: int) -> str:
     return "".join(result[::-1])
 
 
+MAX_SHORT_CODE_LENGTH = len(encode_id_to_base62(MAX_ID))
+
+
 def decode_base62_to_id(short_code: str) -> int:
-    """Преобразует строку base62 обратно в ID"""
+    """
+    Преобразует строку base62 обратно в ID.
+    Принимает только коды, которые выдает encode_id_to_base62
+    для положительного ID, иначе вызывает ValueError.
+    """
+    if (
+        not short_code
+        or len(short_code) > MAX_SHORT_CODE_LENGTH
+        or short_code[0] == BASE62_ALPHABET[0]
+    ):
+        raise ValueError(f"Invalid short code: {short_code!r}")
     num = 0
     for char in short_code:
-        num = num * BASE62_LENGTH + BASE62_ALPHABET.index(char)
+        value = BASE62_INDEX.get(char)
+        if value is None:
+            raise ValueError(f"Invalid short code: {short_code!r}")
+        num = num * BASE62_LENGTH + value
+    if num > MAX_ID:
+        raise ValueError(f"Invalid short code: {short_code!r}")
     return num
+
+
+def parse_recipes_limit(query_params, name="recipes_limit"):
+    """Возвращает положительный параметр name из запроса или None"""
+    try:
+        recipes_limit = int(query_params.get(name))
+    except (ValueError, TypeError):
+        return None
+    return recipes_limit if recipes_limit > 0 else None
+
+
+BASE64_CHUNK_SIZE = 64 * 1024
+IMAGE_SIGNATURES = {
+    b"\xff\xd8\xff": "jpeg",
+    b"\x89PNG\r\n\x1a\n": "png",
+    b"GIF87a": "gif",
+    b"GIF89a": "gif",
+}
+
+
+def _detect_image_type(header):
+    for signature, image_type in IMAGE_SIGNATURES.items():
+        if header.startswith(signature):
+            return image_type
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+def decode_base64_image(data):
+    """
+    Декодирует картинку из data URL частями, не копируя строку целиком.
+    Размер проверяется по длине base64 до декодирования, тип файла -
+    по первым байтам. Большие файлы пишутся во временный файл на диске.
+    """
+    start = data.find(";base64,")
+    if start == -1:
+        raise ValidationError("Invalid image data URL.")
+    start += len(";base64,")
+    encoded_length = len(data) - start
+    size = encoded_length // 4 * 3 - data.count("=", len(data) - 2)
+    if encoded_length % 4 or size <= 0:
+        raise ValidationError("Invalid base64 image data.")
+    if size > MAX_IMAGE_UPLOAD_SIZE:
+        raise ValidationError(
+            f"Image is larger than {MAX_IMAGE_UPLOAD_SIZE} bytes.")
+
+    upload = None
+    try:
+        for offset in range(start, len(data), BASE64_CHUNK_SIZE):
+            chunk = base64.b64decode(
+                data[offset:offset + BASE64_CHUNK_SIZE], validate=True)
+            if upload is None:
+                image_type = _detect_image_type(chunk[:12])
+                if image_type is None:
+                    raise ValidationError("Unsupported image type.")
+                name = f"temp.{image_type}"
+                content_type = f"image/{image_type}"
+                if size > settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
+                    upload = TemporaryUploadedFile(
+                        name, content_type, size, None)
+                else:
+                    upload = InMemoryUploadedFile(
+                        BytesIO(), None, name, content_type, size, None)
+            upload.file.write(chunk)
+    except binascii.Error:
+        if upload is not None:
+            upload.close()
+        raise ValidationError("Invalid base64 image data.")
+    except ValidationError:
+        if upload is not None:
+            upload.close()
+        raise
+    upload.file.seek(0)
+    return upload
@@ -1,22 +1,55 @@
 from rest_framework.response import Response
 from rest_framework import status, viewsets
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.db.models import Count, Exists, F, OuterRef, Prefetch
+from django.db.models.expressions import RawSQL, Window
+from django.db.models.functions import RowNumber
+from django.db.models import prefetch_related_objects
+from django.http import HttpResponseNotFound, StreamingHttpResponse
 from djoser.views import UserViewSet
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.decorators import action
-from rest_framework.filters import SearchFilter
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter, SearchFilter
+from rest_framework.negotiation import DefaultContentNegotiation
 from django_filters import rest_framework as filters
 from django.urls import reverse
 from django.shortcuts import redirect
-from recipes.models import Follow, Ingredient, Recipe, RecipeIngredient
+from foodgram.pagination import (
+    FeedCursorPagination,
+    RecipeCursorPagination,
+    SelectablePaginationMixin,
+    UsernameCursorPagination,
+)
+from recipes.constants import (
+    MAX_SIMILAR_RECIPES_LIMIT,
+    SIMILAR_RECIPES_LIMIT,
+)
+from recipes.feed import UserFeed
+from recipes.models import Follow, Ingredient, Recipe
+from recipes.ingredient_match import match_recipes
+from recipes.search import search_recipes
+from recipes.similarity import similar_recipes
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from .cache import recipe_response_cache
+from .ingredient_index import ingredient_index
 from .permissions import IsAuthorOrReadOnly
-from .utils import encode_id_to_base62, decode_base62_to_id
+from .short_links import short_link_cache
+from .shopping_cart import (
+    SHOPPING_CART_RENDERERS,
+    get_shopping_cart_ingredients,
+)
+from .utils import (
+    MAX_ID,
+    encode_id_to_base62,
+    decode_base62_to_id,
+    parse_recipes_limit,
+)
 from .serializers import (
     CustomUserWithRecipesSerializer,
     FollowSerializer,
     IngredientSerializer,
+    RecipeListSerializer,
     RecipeMinifiedSerializer,
     RecipeSerializer,
     UserAvatarSerializer,
@@ -27,8 +60,19 @@ User = get_user_model()
 
 
 class IngredientSearchFilter(SearchFilter):
+    """
+    Поиск по началу названия. Список ингредиентов отдается из индекса
+    в памяти процесса, без запроса к базе данных.
+    """
+
     search_param = "name"
 
+    def filter_queryset(self, request, queryset, view):
+        search_terms = self.get_search_terms(request)
+        if not search_terms or view.action != "list":
+            return super().filter_queryset(request, queryset, view)
+        return ingredient_index.search(search_terms)
+
 
 class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     """
@@ -43,11 +87,57 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     search_fields = ("^name",)
 
 
-class CustomUserViewSet(UserViewSet):
+def annotate_is_subscribed(queryset, user):
+    """
+    Добавляет к выборке пользователей флаг подписки текущего пользователя
+    одним подзапросом вместо отдельного запроса на каждого автора.
+    """
+    if not user.is_authenticated:
+        return queryset
+    return queryset.annotate(
+        subscribed=Exists(user.following.filter(following=OuterRef("pk")))
+    )
+
+
+def prefetch_limited_recipes(authors, recipes_limit):
+    """
+    Загружает первые recipes_limit рецептов каждого автора одним запросом.
+    Номер рецепта у автора считается оконной функцией ROW_NUMBER(),
+    результат сохраняется в атрибут limited_recipes.
+    """
+    recipes = Recipe.objects.all()
+    if recipes_limit:
+        ranked = Recipe.objects.filter(author__in=authors).annotate(
+            position=Window(
+                expression=RowNumber(),
+                partition_by=F("author_id"),
+                order_by=(F("pub_date").desc(), F("name").asc()),
+            )
+        ).order_by().values("id", "position")
+        sql, params = ranked.query.sql_with_params()
+        recipes = recipes.filter(id__in=RawSQL(
+            f'SELECT "id" FROM ({sql}) AS ranked WHERE "position" <= %s',
+            (*params, recipes_limit),
+        ))
+    prefetch_related_objects(
+        authors, Prefetch("recipes", queryset=recipes,
+                          to_attr="limited_recipes")
+    )
+
+
+class CustomUserViewSet(SelectablePaginationMixin, UserViewSet):
     """
     Вьюсет для работы с пользователями.
     """
 
+    cursor_pagination_class = UsernameCursorPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action not in ("list", "retrieve"):
+            return queryset
+        return annotate_is_subscribed(queryset, self.request.user)
+
     def get_permissions(self):
         if self.action == "retrieve" or self.action == "list":
             return [AllowAny()]
@@ -102,27 +192,55 @@ class CustomUserViewSet(UserViewSet):
     @action(detail=False, methods=["get"], url_path="subscriptions")
     def subscriptions(self, request):
         user = request.user
-        following = User.objects.filter(followers__user=user)
+        following = annotate_is_subscribed(
+            User.objects.filter(followers__user=user), user
+        ).annotate(recipes_count=Count("recipes")).order_by("username")
         page = self.paginate_queryset(following)
-        if page:
-            serializer = CustomUserWithRecipesSerializer(
-                page, context={"request": request}, many=True
-            )
-            return self.get_paginated_response(serializer.data)
+        authors = page if page is not None else list(following)
+        prefetch_limited_recipes(
+            authors, parse_recipes_limit(request.query_params))
         serializer = CustomUserWithRecipesSerializer(
-            following, context={"request": request}, many=True
+            authors, context={"request": request}, many=True
         )
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
         return Response(serializer.data)
 
 
+class NumberInFilter(filters.BaseInFilter, filters.NumberFilter):
+    pass
+
+
 class RecipeFilter(filters.FilterSet):
     is_favorited = filters.NumberFilter(method="filter_by_favorite")
     is_in_shopping_cart = filters.NumberFilter(method="filter_by_cart")
+    search = filters.CharFilter(method="filter_by_search")
+    have_ingredients = NumberInFilter(method="filter_by_have_ingredients")
+    fully_covered = filters.NumberFilter(method="filter_by_fully_covered")
 
     class Meta:
         model = Recipe
         fields = ("author",)
 
+    def filter_by_search(self, queryset, name, value):
+        value = value.strip()
+        if not value:
+            return queryset
+        return search_recipes(queryset, value)
+
+    def filter_by_have_ingredients(self, queryset, name, value):
+        if not value:
+            return queryset
+        return match_recipes(
+            queryset,
+            [int(ingredient_id) for ingredient_id in value],
+            fully_covered=self.form.cleaned_data.get("fully_covered") == 1,
+        )
+
+    def filter_by_fully_covered(self, queryset, name, value):
+        # Учитывается в filter_by_have_ingredients.
+        return queryset
+
     def filter_by_favorite(self, queryset, name, value):
         return self._filter_by_relation(queryset, value, "users_favorited")
 
@@ -136,18 +254,77 @@ class RecipeFilter(filters.FilterSet):
         return queryset.filter(**{f"{relation_name}__id": user.id})
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeOrderingFilter(OrderingFilter):
+    """
+    Сортировка по популярности: /recipes/?ordering=-favorite_count.
+    При равных значениях рецепты упорядочены как по умолчанию.
+    """
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if not ordering:
+            return ordering
+        return [*ordering, *Recipe._meta.ordering]
+
+
+class FileFormatContentNegotiation(DefaultContentNegotiation):
+    """
+    Параметр ?format= задает формат выгружаемого файла, поэтому
+    не используется для выбора рендерера DRF.
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+class RecipeViewSet(SelectablePaginationMixin, viewsets.ModelViewSet):
     """
     Вьюсет для работы с рецептами.
     Поддерживает все стандартные операции CRUD.
     """
 
+    cursor_pagination_class = RecipeCursorPagination
+
     queryset = Recipe.objects.prefetch_related(
         "ingredient_amounts__ingredient").all()
     serializer_class = RecipeSerializer
-    filter_backends = (filters.DjangoFilterBackend,)
+    filter_backends = (filters.DjangoFilterBackend, RecipeOrderingFilter)
     filterset_class = RecipeFilter
+    ordering_fields = ("favorite_count",)
     permission_classes = (IsAuthorOrReadOnly,)
+    list_actions = ("list", "feed", "similar")
+
+    def get_serializer_class(self):
+        if self.action in self.list_actions:
+            return RecipeListSerializer
+        return super().get_serializer_class()
+
+    def get_queryset(self):
+        user = self.request.user
+        queryset = super().get_queryset()
+        if not user.is_authenticated:
+            return queryset.select_related("author")
+        return queryset.annotate(
+            favorited=Exists(
+                user.favorite_recipes.filter(pk=OuterRef("pk"))),
+            in_shopping_cart=Exists(
+                user.shopping_cart.filter(pk=OuterRef("pk"))),
+        ).prefetch_related(
+            Prefetch("author", queryset=annotate_is_subscribed(
+                User.objects.all(), user))
+        )
+
+    def list(self, request, *args, **kwargs):
+        return recipe_response_cache.fetch(
+            request, lambda: super(RecipeViewSet, self).list(
+                request, *args, **kwargs)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return recipe_response_cache.fetch(
+            request, lambda: super(RecipeViewSet, self).retrieve(
+                request, *args, **kwargs)
+        )
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
@@ -189,13 +366,54 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return self._handle_user_lists(request,
                                        "shopping_cart", *args, **kwargs)
 
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="feed",
+        permission_classes=[IsAuthenticated],
+    )
+    def feed(self, request):
+        """
+        Лента рецептов авторов из подписок, новые первыми.
+        Листается по ссылке next, размер страницы задает ?limit=.
+        """
+        paginator = FeedCursorPagination()
+        recipes = paginator.paginate_queryset(
+            UserFeed(request.user, self.get_queryset()), request, view=self)
+        serializer = self.get_serializer(recipes, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=["get"], url_path="similar")
+    def similar(self, request, pk=None):
+        """
+        Рецепты с самым похожим набором ингредиентов, самые похожие
+        первыми. Их число задает ?limit= (не больше
+        MAX_SIMILAR_RECIPES_LIMIT).
+        """
+        recipe = self.get_object()
+        limit = min(
+            parse_recipes_limit(request.query_params, "limit")
+            or SIMILAR_RECIPES_LIMIT,
+            MAX_SIMILAR_RECIPES_LIMIT,
+        )
+        recipes = similar_recipes(self.get_queryset(), recipe)[:limit]
+        serializer = self.get_serializer(recipes, many=True)
+        return Response(serializer.data)
+
     @action(detail=True, methods=["get"], url_path="get-link")
     def get_short_link(self, request, pk=None):
         """
         Генерирует короткую ссылку для рецепта.
+        Существование рецепта проверяется по кэшу коротких ссылок.
         """
-        recipe = self.get_object()
-        short_code = encode_id_to_base62(recipe.id)
+        try:
+            recipe_id = int(pk)
+        except ValueError:
+            raise NotFound()
+        if not (0 < recipe_id <= MAX_ID
+                and short_link_cache.recipe_exists(recipe_id)):
+            raise NotFound()
+        short_code = encode_id_to_base62(recipe_id)
         relative_url = reverse("short-link-redirect",
                                kwargs={"short_code": short_code})
         full_short_url = request.build_absolute_uri(relative_url)
@@ -207,37 +425,45 @@ class RecipeViewSet(viewsets.ModelViewSet):
         methods=["get"],
         url_path="download_shopping_cart",
         permission_classes=[IsAuthenticated],
+        content_negotiation_class=FileFormatContentNegotiation,
     )
     def download_shopping_cart(self, request):
-        """Формирует текстовый файл со списком покупок."""
-        user = request.user
-        shopping_cart = user.shopping_cart.all()
-        ingredients = (
-            RecipeIngredient.objects.filter(recipe__in=shopping_cart)
-            .values("ingredient__name", "ingredient__measurement_unit")
-            .annotate(total_amount=Sum("amount"))
-            .order_by("ingredient__name")
-        )
-        content_lines = []
-        for i, ingredient in enumerate(ingredients):
-            line = (
-                f'{i+1}. '
-                f'{ingredient["ingredient__name"].title()} '
-                f'({ingredient["ingredient__measurement_unit"]})'
-                f' — {ingredient["total_amount"]}'
+        """
+        Отдает список покупок файлом по частям.
+        Формат выбирается параметром ?format=txt|csv|json.
+        """
+        file_format = request.query_params.get("format", "txt")
+        renderer_class = SHOPPING_CART_RENDERERS.get(file_format)
+        if renderer_class is None:
+            formats = ", ".join(SHOPPING_CART_RENDERERS)
+            return Response(
+                {"format": [f"Supported formats: {formats}"]},
+                status=status.HTTP_400_BAD_REQUEST,
             )
-            content_lines.append(line)
-        text_content = "\n".join(content_lines)
-        if text_content:
-            text_content += "\n"
-        filename = "shopping_cart.txt"
-        response = HttpResponse(text_content, content_type="text/plain")
-        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        renderer = renderer_class()
+        ingredients = get_shopping_cart_ingredients(request.user)
+        if settings.SERVER_MODE == "asgi":
+            # ASGI-обработчик Django 3.2 перебирает тело ответа в цикле
+            # событий, где запросы к базе запрещены, поэтому строки
+            # читаются здесь, в потоке вьюхи. Файл по-прежнему
+            # отдается частями.
+            ingredients = list(ingredients)
+        response = StreamingHttpResponse(
+            renderer.render(ingredients), content_type=renderer.content_type
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="{renderer.filename}"'
+        )
         return response
 
 
 def redirect_short_link(request, short_code):
-    recipe_id = decode_base62_to_id(short_code)
+    try:
+        recipe_id = decode_base62_to_id(short_code)
+    except ValueError:
+        return HttpResponseNotFound()
+    if not short_link_cache.recipe_exists(recipe_id):
+        return HttpResponseNotFound()
     # api redirection
     # detail_url = reverse('recipe-detail', kwargs={'pk': recipe_id})
     # return redirect(detail_url)
@@ -4,16 +4,21 @@ sleep 5
 echo "Applying database migrations..."
 python manage.py migrate --noinput
 
-echo "Loading initial data"
-if python manage.py shell -c "from recipes.models import Ingredient; exit(0) if Ingredient.objects.exists() else exit(1)"; then
-    echo "Ingredients table is not empty - skipping fixture loading"
-else
-    echo "Loading ingredients fixture..."
-    python manage.py loaddata ingredients_fixture.json
+echo "Loading ingredients..."
+INGREDIENTS_FILE="${INGREDIENTS_FILE:-data/ingredients.csv}"
+if [ ! -f "$INGREDIENTS_FILE" ]; then
+    INGREDIENTS_FILE=ingredients_fixture.json
 fi
+python manage.py load_ingredients "$INGREDIENTS_FILE"
 
 echo "Collecting static files..."
 python manage.py collectstatic --noinput
 
+if [ "$SERVER_MODE" = "asgi" ]; then
+    echo "Starting Gunicorn server with Uvicorn workers..."
+    exec gunicorn --bind 0.0.0.0:8000 \
+        --worker-class uvicorn.workers.UvicornWorker foodgram.asgi:application
+fi
+
 echo "Starting Gunicorn server..."
 exec gunicorn --bind 0.0.0.0:8000 foodgram.wsgi
\ No newline at end of file
@@ -0,0 +1,275 @@
+import hashlib
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from threading import Lock
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse
+
+
+# Границы корзин гистограммы задержек, в секундах.
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+# Сколько самых частых повторяющихся запросов хранить на эндпоинт.
+MAX_DUPLICATE_FINGERPRINTS = 10
+
+_current_recorder = ContextVar("current_query_recorder", default=None)
+
+
+class QueryRecorder:
+    """Считает SQL-запросы одного HTTP-запроса и их суммарное время"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.statements[sql] += 1
+
+    def duplicates(self):
+        return {
+            sql: count for sql, count in self.statements.items() if count > 1
+        }
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Обертка выполнения запросов, которая передает запрос регистратору
+    текущего HTTP-запроса. Контекстная переменная переносится asgiref
+    в потоки sync_to_async, поэтому учитываются и запросы из пула
+    потоков в режиме ASGI.
+    """
+    recorder = _current_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_query_recorder(connection, **kwargs):
+    # Соединения потоко-локальны, поэтому обертка ставится на каждое.
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def fingerprint(sql):
+    return hashlib.md5(sql.encode()).hexdigest()[:12]
+
+
+class EndpointStats:
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.requests = 0
+        self.duration = 0.0
+        self.queries = 0
+        self.query_duration = 0.0
+        self.duplicate_queries = 0
+        self.duplicates = Counter()
+
+
+class MetricsRegistry:
+    """
+    Метрики эндпоинтов в памяти процесса.
+    При нескольких воркерах каждый отдает свои значения.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._endpoints = defaultdict(EndpointStats)
+        self._statements = {}
+        self._collectors = []
+
+    def add_collector(self, collect):
+        """
+        Добавляет функцию, которая возвращает дополнительные строки
+        метрик, например состояние пула соединений.
+        """
+        self._collectors.append(collect)
+
+    def observe(self, endpoint, duration, recorder):
+        duplicates = recorder.duplicates()
+        with self._lock:
+            stats = self._endpoints[endpoint]
+            stats.requests += 1
+            stats.duration += duration
+            stats.buckets[bisect_left(LATENCY_BUCKETS, duration)] += 1
+            stats.queries += recorder.count
+            stats.query_duration += recorder.duration
+            for sql, count in duplicates.items():
+                key = fingerprint(sql)
+                self._statements.setdefault(key, sql)
+                stats.duplicate_queries += count - 1
+                stats.duplicates[key] += count - 1
+            if len(stats.duplicates) > MAX_DUPLICATE_FINGERPRINTS:
+                stats.duplicates = Counter(dict(
+                    stats.duplicates.most_common(MAX_DUPLICATE_FINGERPRINTS)))
+                self._prune_statements()
+
+    def _prune_statements(self):
+        # Текст запроса хранится, пока его отпечаток есть хотя бы у одного
+        # эндпоинта, поэтому словарь не больше MAX_DUPLICATE_FINGERPRINTS
+        # на эндпоинт.
+        used = set().union(
+            *(stats.duplicates for stats in self._endpoints.values()))
+        for key in self._statements.keys() - used:
+            del self._statements[key]
+
+    def render(self):
+        """Метрики в текстовом формате Prometheus"""
+        with self._lock:
+            endpoints = sorted(self._endpoints.items())
+            lines = [
+                "# HELP foodgram_request_duration_seconds "
+                "Request latency by endpoint.",
+                "# TYPE foodgram_request_duration_seconds histogram",
+            ]
+            for endpoint, stats in endpoints:
+                cumulative = 0
+                for bound, count in zip(
+                    (*LATENCY_BUCKETS, "+Inf"), stats.buckets
+                ):
+                    cumulative += count
+                    lines.append(
+                        "foodgram_request_duration_seconds_bucket"
+                        f'{{endpoint="{endpoint}",le="{bound}"}} {cumulative}'
+                    )
+                lines.append(
+                    "foodgram_request_duration_seconds_sum"
+                    f'{{endpoint="{endpoint}"}} {stats.duration}')
+                lines.append(
+                    "foodgram_request_duration_seconds_count"
+                    f'{{endpoint="{endpoint}"}} {stats.requests}')
+            for name, help_text, attribute in (
+                ("foodgram_db_queries_total",
+                 "SQL queries by endpoint.", "queries"),
+                ("foodgram_db_query_duration_seconds_total",
+                 "Time spent in SQL by endpoint.", "query_duration"),
+                ("foodgram_db_duplicate_queries_total",
+                 "Repeated identical SQL within one request.",
+                 "duplicate_queries"),
+            ):
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} counter")
+                lines.extend(
+                    f'{name}{{endpoint="{endpoint}"}} '
+                    f"{getattr(stats, attribute)}"
+                    for endpoint, stats in endpoints
+                )
+            name = "foodgram_db_duplicate_query_fingerprint_total"
+            lines.append(
+                f"# HELP {name} Most repeated SQL by endpoint; "
+                "the statements are listed in comments below.")
+            lines.append(f"# TYPE {name} counter")
+            fingerprints = set()
+            for endpoint, stats in endpoints:
+                for key, count in stats.duplicates.most_common():
+                    fingerprints.add(key)
+                    lines.append(
+                        f'{name}{{endpoint="{endpoint}",'
+                        f'fingerprint="{key}"}} {count}')
+            for key in sorted(fingerprints):
+                statement = " ".join(self._statements[key].split())
+                lines.append(f"# fingerprint {key}: {statement}")
+        for collect in self._collectors:
+            lines.extend(collect())
+        return "\n".join(lines) + "\n"
+
+
+metrics_registry = MetricsRegistry()
+
+
+def get_endpoint_name(request):
+    """
+    Имя эндпоинта для метрик: вьюсет и действие DRF
+    (RecipeViewSet.list), класс и метод для APIView или имя функции.
+    """
+    match = request.resolver_match
+    if match is None:
+        return "unmatched"
+    view = match.func
+    view_class = getattr(view, "cls", None)
+    if view_class is None:
+        return getattr(view, "__name__", "unknown")
+    method = request.method.lower()
+    actions = getattr(view, "actions", None) or {}
+    return f"{view_class.__name__}.{actions.get(method, method)}"
+
+
+class MetricsMiddleware:
+    """
+    Измеряет время ответа, число и время SQL-запросов по эндпоинтам
+    и добавляет заголовок Server-Timing. Работает и в режиме WSGI,
+    и в режиме ASGI. Отключается настройкой METRICS_ENABLED.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "METRICS_ENABLED", True):
+            raise MiddlewareNotUsed
+        # Соединения, открытые до загрузки middleware (например,
+        # в shell), сигнал connection_created уже пропустили.
+        for connection in connections.all():
+            install_query_recorder(connection)
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            # Так Django распознает асинхронный вызов middleware.
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        token = _current_recorder.set(recorder)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_recorder.reset(token)
+        return self.finish(request, response, recorder, started)
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        token = _current_recorder.set(recorder)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_recorder.reset(token)
+        return self.finish(request, response, recorder, started)
+
+    def finish(self, request, response, recorder, started):
+        duration = time.perf_counter() - started
+        metrics_registry.observe(
+            get_endpoint_name(request), duration, recorder)
+        response["Server-Timing"] = (
+            f'db;dur={recorder.duration * 1000:.1f};'
+            f'desc="{recorder.count} queries", '
+            f"total;dur={duration * 1000:.1f}"
+        )
+        return response
+
+
+def metrics_view(request):
+    """Метрики для Prometheus; адрес не проксируется nginx наружу"""
+    return HttpResponse(
+        metrics_registry.render(),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
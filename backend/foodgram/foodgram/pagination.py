@@ -1,5 +1,288 @@
-from rest_framework.pagination import PageNumberPagination
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import (
+    Cursor,
+    CursorPagination,
+    PageNumberPagination,
+)
+from rest_framework.settings import api_settings
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Берет количество объектов из оценки планировщика PostgreSQL
+    (для таблицы без фильтров это pg_class.reltuples) вместо COUNT(*).
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor != "postgresql":
+            return super().count
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            plan = cursor.fetchone()[0]
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class UncountedPaginator(Paginator):
+    """
+    Не считает объекты: следующая страница определяется по тому,
+    вернула ли выборка на один объект больше размера страницы.
+    """
+
+    count = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._last_page = 1
+
+    @property
+    def num_pages(self):
+        return self._last_page
+
+    def validate_number(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger("That page number is not an integer")
+        if number < 1:
+            raise EmptyPage("That page number is less than 1")
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        objects = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not objects and number > 1:
+            raise EmptyPage("That page contains no results")
+        has_next = len(objects) > self.per_page
+        self._last_page = number + 1 if has_next else number
+        return self._get_page(objects[:self.per_page], number, self)
 
 
 class CustomPageNumberPagination(PageNumberPagination):
+    """
+    Постраничная пагинация. Параметр ?count=exact|approximate|none
+    задает, как считать общее количество объектов.
+    """
+
+    page_size_query_param = "limit"
+    count_query_param = "count"
+    count_paginator_classes = {
+        "exact": Paginator,
+        "approximate": EstimatedCountPaginator,
+        "none": UncountedPaginator,
+    }
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.django_paginator_class = self.count_paginator_classes.get(
+            request.query_params.get(self.count_query_param),
+            Paginator,
+        )
+        return super().paginate_queryset(queryset, request, view)
+
+
+class RecipeCursorPagination(CursorPagination):
+    """
+    Пагинация по ключу (pub_date, id) без OFFSET и COUNT(*).
+    Если клиент задал ?ordering=, ключом становится выбранное поле,
+    дополненное (pub_date, id): у популярности много равных значений,
+    и позиция по одному полю не определяла бы место на странице.
+    Позиция курсора хранит значения всех полей ключа.
+
+    Поиск и подбор по продуктам сортируют по вычисляемой релевантности,
+    которую нельзя сохранить в позиции курсора, поэтому с ними
+    пагинация по ключу не работает: ответ 400.
+    """
+
+    ordering = ("-pub_date", "-id")
     page_size_query_param = "limit"
+    position_separator = "|"
+    ranked_query_params = ("search", "have_ingredients")
+    ranked_query_message = (
+        "Cursor pagination does not support the {param} parameter."
+    )
+
+    def get_ordering(self, request, queryset, view):
+        for param in self.ranked_query_params:
+            if request.query_params.get(param, "").strip():
+                raise ValidationError({
+                    param: [self.ranked_query_message.format(param=param)],
+                })
+        if api_settings.ORDERING_PARAM not in request.query_params:
+            return self.ordering
+        # Неизвестное или пустое поле сортировки отбрасывается
+        # так же, как в OrderingFilter вьюсета.
+        ordering = OrderingFilter().get_ordering(request, queryset, view)
+        if not ordering:
+            return self.ordering
+        return (ordering[0], *self.ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        position = self.cursor.position if self.cursor is not None else None
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(
+                field_name[1:] if field_name.startswith("-")
+                else f"-{field_name}"
+                for field_name in ordering
+            )
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self._after_position(
+                queryset.model, ordering, position))
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_following = len(results) > self.page_size
+        # Позиция уникальна, поэтому смещение в курсоре не нужно: соседние
+        # страницы начинаются сразу после первого и последнего объекта.
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_following
+        else:
+            self.has_next = has_following
+            self.has_previous = position is not None
+        self.current_position = position
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        position = self.current_position
+        if self.page:
+            position = self._get_position_from_instance(
+                self.page[-1], self.ordering)
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        position = self.current_position
+        if self.page:
+            position = self._get_position_from_instance(
+                self.page[0], self.ordering)
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=True, position=position))
+
+    def _get_position_from_instance(self, instance, ordering):
+        return self.position_separator.join(
+            str(getattr(instance, field_name.lstrip("-")))
+            for field_name in ordering
+        )
+
+    def _after_position(self, model, ordering, position):
+        """
+        Условие «после позиции» для составного ключа: первые поля равны
+        значениям позиции, следующее за ними — больше или меньше
+        в зависимости от направления сортировки.
+        """
+        values = position.split(self.position_separator)
+        if len(values) != len(ordering):
+            raise NotFound(self.invalid_cursor_message)
+        condition = Q()
+        equal = Q()
+        for field_name, value in zip(ordering, values):
+            name = field_name.lstrip("-")
+            try:
+                value = model._meta.get_field(name).to_python(value)
+            except DjangoValidationError:
+                raise NotFound(self.invalid_cursor_message)
+            lookup = "lt" if field_name.startswith("-") else "gt"
+            condition |= equal & Q(**{f"{name}__{lookup}": value})
+            equal &= Q(**{name: value})
+        return condition
+
+
+class UsernameCursorPagination(CursorPagination):
+    """Пагинация по ключу username без OFFSET и COUNT(*)."""
+
+    ordering = ("username",)
+    page_size_query_param = "limit"
+
+
+class FeedCursorPagination(CursorPagination):
+    """
+    Пагинация ленты подписок по ключу (pub_date, id). Вместо QuerySet
+    принимает объект ленты с методом page(limit, before), см.
+    recipes.feed.UserFeed. Лента листается только вперед.
+    """
+
+    page_size_query_param = "limit"
+
+    def paginate_queryset(self, feed, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        before = None
+        if cursor is not None:
+            before = self.parse_position(cursor.position)
+        recipes = feed.page(self.page_size + 1, before)
+        self.has_next = len(recipes) > self.page_size
+        self.page = recipes[:self.page_size]
+        return self.page
+
+    def parse_position(self, position):
+        pub_date, _, recipe_id = (position or "").rpartition("|")
+        try:
+            pub_date = parse_datetime(pub_date)
+            recipe_id = int(recipe_id)
+        except ValueError:
+            pub_date = None
+        if pub_date is None:
+            raise NotFound(self.invalid_cursor_message)
+        return pub_date, recipe_id
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        return self.encode_cursor(Cursor(
+            offset=0, reverse=False,
+            position=f"{last.pub_date.isoformat()}|{last.pk}",
+        ))
+
+    def get_previous_link(self):
+        return None
+
+
+class SelectablePaginationMixin:
+    """
+    Позволяет клиенту включить пагинацию по ключу параметром
+    ?pagination=cursor. По умолчанию остается постраничная пагинация.
+    """
+
+    cursor_pagination_class = None
+    pagination_query_param = "pagination"
+
+    @property
+    def paginator(self):
+        if not hasattr(self, "_paginator"):
+            use_cursor = (
+                self.cursor_pagination_class is not None
+                and self.request.query_params.get(
+                    self.pagination_query_param) == "cursor"
+            )
+            if use_cursor:
+                self._paginator = self.cursor_pagination_class()
+            else:
+                self._paginator = super().paginator
+        return self._paginator
@@ -0,0 +1,74 @@
+from django.db.backends.postgresql import base
+
+from foodgram.postgresql.pool import get_pool
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    Бэкенд PostgreSQL с проверкой постоянных соединений и пулом.
+
+    CONN_HEALTH_CHECKS: перед первым запросом в рамках HTTP-запроса
+    повторно используемое соединение проверяется (SELECT 1), и разорванное
+    соединение открывается заново, а не роняет запрос. В Django 3.2 этой
+    настройки еще нет.
+
+    POOL: словарь с MAX_SIZE, TIMEOUT и MAX_IDLE включает пул соединений
+    процесса (см. foodgram.postgresql.pool). Закрытое Django соединение
+    возвращается в пул, поэтому вместе с пулом используется
+    CONN_MAX_AGE = 0.
+    """
+
+    health_check_done = False
+
+    @property
+    def pool(self):
+        options = self.settings_dict.get("POOL")
+        if not options:
+            return None
+        return get_pool(self.alias, options)
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            self.health_check_done = True
+            return super().get_new_connection(conn_params)
+        connection = pool.get()
+        if connection is None:
+            try:
+                connection = super().get_new_connection(conn_params)
+            except BaseException:
+                pool.release()
+                raise
+            self.health_check_done = True
+        else:
+            self.isolation_level = self.settings_dict["OPTIONS"].get(
+                "isolation_level", connection.isolation_level)
+            self.health_check_done = False
+        return connection
+
+    def _close(self):
+        pool = self.pool
+        if pool is None or self.connection is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            pool.put(self.connection)
+
+    def close_if_unusable_or_obsolete(self):
+        # Вызывается в начале и в конце каждого HTTP-запроса. Внутри
+        # get_autocommit() вызывает ensure_connection, где проверка
+        # не нужна: она выполнится перед первым запросом к базе.
+        self.health_check_done = True
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
+
+    def ensure_connection(self):
+        super().ensure_connection()
+        if (
+            self.settings_dict.get("CONN_HEALTH_CHECKS")
+            and not self.health_check_done
+            and not self.in_atomic_block
+        ):
+            self.health_check_done = True
+            if not self.is_usable():
+                self.close()
+                super().ensure_connection()
@@ -0,0 +1,163 @@
+import os
+import threading
+import time
+from collections import deque
+
+from psycopg2 import OperationalError, extensions
+
+from foodgram.metrics import metrics_registry
+
+
+class ConnectionPool:
+    """
+    Пул соединений с PostgreSQL внутри процесса.
+
+    Потоки процесса берут соединения из общего пула, а если свободных
+    нет и пул заполнен, ждут не дольше timeout. Соединения, которые
+    простаивали дольше max_idle секунд, закрываются при выдаче.
+    Воркеры gunicorn получают собственные пулы (см. get_pool).
+    """
+
+    def __init__(self, name, max_size, timeout=10, max_idle=300):
+        self.name = name
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        # Пары (соединение, время возврата); новые справа.
+        self._idle = deque()
+        self._condition = threading.Condition()
+        self.in_use = 0
+        self.waiting = 0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_duration = 0.0
+
+    def get(self):
+        """
+        Занимает место в пуле и возвращает свободное соединение или None:
+        тогда вызывающий открывает новое, а при ошибке вызывает release.
+        """
+        started = time.monotonic()
+        stale = []
+        with self._condition:
+            self.waiting += 1
+            try:
+                while self.in_use >= self.max_size:
+                    remaining = started + self.timeout - time.monotonic()
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise OperationalError(
+                            f"Connection pool {self.name} exhausted: "
+                            f"{self.max_size} connections in use for "
+                            f"{self.timeout}s."
+                        )
+                    self._condition.wait(remaining)
+            finally:
+                self.waiting -= 1
+            self.in_use += 1
+            self.checkouts += 1
+            self.wait_duration += time.monotonic() - started
+            oldest = time.monotonic() - self.max_idle
+            while self._idle and self._idle[0][1] < oldest:
+                stale.append(self._idle.popleft()[0])
+            connection = self._idle.pop()[0] if self._idle else None
+        for old_connection in stale:
+            old_connection.close()
+        return connection
+
+    def put(self, connection):
+        """Возвращает соединение в пул, сломанное закрывает"""
+        reusable = not connection.closed
+        if reusable:
+            status = connection.info.transaction_status
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                reusable = False
+            elif status != extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    connection.rollback()
+                except Exception:
+                    reusable = False
+        if not reusable:
+            connection.close()
+        self.release(connection if reusable else None)
+
+    def release(self, connection=None):
+        with self._condition:
+            self.in_use -= 1
+            if connection is not None:
+                self._idle.append((connection, time.monotonic()))
+            self._condition.notify()
+
+    def stats(self):
+        with self._condition:
+            return {
+                "in_use": self.in_use,
+                "idle": len(self._idle),
+                "max_size": self.max_size,
+                "waiting": self.waiting,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_duration": self.wait_duration,
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, options):
+    """
+    Пул для базы alias в текущем процессе. Ключ содержит PID: если
+    пул создан до fork (gunicorn --preload), воркер не станет делить
+    сокеты с мастером, а создаст свой.
+    """
+    key = (os.getpid(), alias)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(
+                alias,
+                max_size=options.get("MAX_SIZE", 10),
+                timeout=options.get("TIMEOUT", 10),
+                max_idle=options.get("MAX_IDLE", 300),
+            )
+    return pool
+
+
+def collect_pool_metrics():
+    """Метрики пулов текущего процесса в формате Prometheus"""
+    with _pools_lock:
+        pools = [
+            pool for (pid, _), pool in sorted(_pools.items())
+            if pid == os.getpid()
+        ]
+    if not pools:
+        return []
+    stats = [(pool.name, pool.stats()) for pool in pools]
+    lines = []
+    for name, metric_type, help_text, key in (
+        ("foodgram_db_pool_connections_in_use", "gauge",
+         "Connections checked out of the pool.", "in_use"),
+        ("foodgram_db_pool_connections_idle", "gauge",
+         "Open connections waiting in the pool.", "idle"),
+        ("foodgram_db_pool_max_connections", "gauge",
+         "Pool size limit; in_use / max is the saturation.", "max_size"),
+        ("foodgram_db_pool_waiting_threads", "gauge",
+         "Threads waiting for a free connection.", "waiting"),
+        ("foodgram_db_pool_checkouts_total", "counter",
+         "Connections handed out by the pool.", "checkouts"),
+        ("foodgram_db_pool_timeouts_total", "counter",
+         "Checkouts that gave up waiting for a connection.", "timeouts"),
+        ("foodgram_db_pool_wait_seconds_total", "counter",
+         "Time spent waiting for a free connection.", "wait_duration"),
+    ):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        lines.extend(
+            f'{name}{{database="{alias}"}} {values[key]}'
+            for alias, values in stats
+        )
+    return lines
+
+
+metrics_registry.add_collector(collect_pool_metrics)
@@ -39,6 +39,7 @@ INSTALLED_APPS = [
     "users.apps.UsersConfig",
     "api.apps.ApiConfig",
     "django.contrib.admin",
+    "django.contrib.postgres",
     "django.contrib.auth",
     "django.contrib.contenttypes",
     "django.contrib.sessions",
@@ -52,6 +53,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "foodgram.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
@@ -82,6 +84,14 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "foodgram.wsgi.application"
 
+# wsgi или asgi; в режиме asgi чтение рецептов и ингредиентов
+# обслуживают асинхронные вьюхи (см. api.async_views).
+SERVER_MODE = os.getenv("SERVER_MODE", "wsgi")
+ASYNC_READ_WORKERS = int(os.getenv("ASYNC_READ_WORKERS", 16))
+
+# Метрики эндпоинтов (см. foodgram.metrics), отдаются по адресу /metrics/.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
 
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
@@ -92,15 +102,60 @@ DATABASES = {
     #     "NAME": BASE_DIR / "db.sqlite3",
     # }
     "default": {
-        "ENGINE": "django.db.backends.postgresql",
+        # PostgreSQL с проверкой соединений и пулом (см. foodgram.postgresql).
+        "ENGINE": "foodgram.postgresql",
         "NAME": os.getenv("POSTGRES_DB", "django"),
         "USER": os.getenv("POSTGRES_USER", "django"),
         "PASSWORD": os.getenv("POSTGRES_PASSWORD", ""),
         "HOST": os.getenv("DB_HOST", ""),
         "PORT": os.getenv("DB_PORT", 5432),
+        "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", 60)),
+        "CONN_HEALTH_CHECKS": (
+            os.getenv("DB_CONN_HEALTH_CHECKS", "true").lower() == "true"),
+        "POOL": None,
+    }
+}
+
+# Пул соединений процесса включается ненулевым DB_POOL_SIZE. Соединение
+# возвращается в пул в конце запроса, поэтому CONN_MAX_AGE не нужен.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 0))
+if DB_POOL_SIZE:
+    DATABASES["default"]["CONN_MAX_AGE"] = 0
+    DATABASES["default"]["POOL"] = {
+        "MAX_SIZE": DB_POOL_SIZE,
+        "TIMEOUT": float(os.getenv("DB_POOL_TIMEOUT", 10)),
+        "MAX_IDLE": float(os.getenv("DB_POOL_MAX_IDLE", 300)),
+    }
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
     }
 }
 
+if os.getenv("REDIS_URL"):
+    CACHES["default"] = {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": os.getenv("REDIS_URL"),
+    }
+
+RECIPE_CACHE_TIMEOUT = int(os.getenv("RECIPE_CACHE_TIMEOUT", 300))
+SHORT_LINK_CACHE_TIMEOUT = int(
+    os.getenv("SHORT_LINK_CACHE_TIMEOUT", 24 * 60 * 60))
+# Индекс ингредиентов процесса сверяется с версией в общем кэше не чаще
+# раза в INGREDIENT_INDEX_CHECK_INTERVAL секунд (см. api.ingredient_index).
+INGREDIENT_INDEX_CHECK_INTERVAL = float(
+    os.getenv("INGREDIENT_INDEX_CHECK_INTERVAL", 5))
+INGREDIENT_INDEX_MAX_AGE = float(os.getenv("INGREDIENT_INDEX_MAX_AGE", 300))
+# Пользователь по токену кэшируется в общем кэше и в памяти процесса
+# (см. api.authentication).
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.getenv("AUTH_TOKEN_CACHE_TIMEOUT", 300))
+AUTH_TOKEN_LOCAL_CACHE_TIMEOUT = float(
+    os.getenv("AUTH_TOKEN_LOCAL_CACHE_TIMEOUT", 5))
+# Рецепты авторов, у которых подписчиков больше этого числа, не
+# рассылаются по лентам, а подмешиваются при чтении (см. recipes.feed).
+FEED_FANOUT_LIMIT = int(os.getenv("FEED_FANOUT_LIMIT", 1000))
+
 CORS_ORIGIN_WHITELIST = [
     "http://localhost",
     "http://localhost:3000",
@@ -129,6 +184,8 @@ MEDIA_URL = "/media/"
 
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+IMAGE_PROCESSING_WORKERS = int(os.getenv("IMAGE_PROCESSING_WORKERS", 2))
+
 # Internationalization
 # https://docs.djangoproject.com/en/3.2/topics/i18n/
 
@@ -162,7 +219,7 @@ REST_FRAMEWORK = {
         "rest_framework.permissions.IsAuthenticatedOrReadOnly",
     ],
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.TokenAuthentication",
+        "api.authentication.CachedTokenAuthentication",
     ],
     "DEFAULT_PAGINATION_CLASS": "foodgram.pagination.CustomPageNumberPagination",
     "PAGE_SIZE": 10,
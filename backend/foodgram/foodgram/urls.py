@@ -2,12 +2,18 @@ from django.contrib import admin
 from django.conf import settings
 from django.urls import include, path
 from django.conf.urls.static import static
+from api.async_views import async_read_view
 from api.views import redirect_short_link
+from .metrics import metrics_view
+
+if settings.SERVER_MODE == "asgi":
+    redirect_short_link = async_read_view(redirect_short_link)
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/", include("api.urls")),
     path("s/<str:short_code>/", redirect_short_link, name="short-link-redirect"),
+    path("metrics/", metrics_view, name="metrics"),
 ]
 
 if settings.DEBUG:
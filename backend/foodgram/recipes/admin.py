@@ -32,16 +32,19 @@ class RecipesAdmin(admin.ModelAdmin):
         "cooking_time",
         "pub_date",
         "favorite_count",
+        "cart_count",
     )
-    readonly_fields = ("pub_date", "favorite_count")
-
-    def favorite_count(self, obj):
-        return obj.users_favorited.count()
-
-    favorite_count.short_description = "В избранном"
+    readonly_fields = ("pub_date", "favorite_count", "cart_count")
 
     inlines = [RecipeIngredientInline]
 
+    def save_model(self, request, obj, form, change):
+        if not change:
+            return super().save_model(request, obj, form, change)
+        # Сохраняются только измененные в форме поля, чтобы не затереть
+        # счетчики и миниатюры, обновленные после загрузки страницы.
+        obj.save(update_fields=form.changed_data)
+
 
 class IngredientsAdmin(admin.ModelAdmin):
     search_fields = ("name",)
@@ -5,3 +5,14 @@ class RecipesConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "recipes"
     verbose_name = "Рецепты"
+
+    def ready(self):
+        from . import (  # noqa: F401
+            counters,
+            feed,
+            images,
+            ingredient_match,
+            search,
+            shopping_list,
+            similarity,
+        )
@@ -2,3 +2,20 @@ MIN_COOKING_TIME = 1
 MAX_COOKING_TIME = 32_000
 MIN_INGREDIENT_AMOUNT = 1
 MAX_INGREDIENT_AMOUNT = 32_000
+MAX_IMAGE_PIXELS = 40_000_000
+IMAGE_FORMATS = ("JPEG", "PNG", "GIF", "WEBP")
+THUMBNAIL_SIZES = {
+    "small": 320,
+    "medium": 720,
+}
+MAX_IMAGE_UPLOAD_SIZE = 10 * 1024 * 1024
+SEARCH_CONFIG = "russian"
+# Сколько последних рецептов автора попадает в ленту нового подписчика.
+FEED_BACKFILL_SIZE = 100
+# MinHash/LSH для похожих рецептов (см. recipes.similarity): подпись
+# из MINHASH_BANDS * MINHASH_BAND_ROWS хешей делится на полосы.
+# После изменения нужно запустить rebuild_similarity_index.
+MINHASH_BANDS = 32
+MINHASH_BAND_ROWS = 3
+SIMILAR_RECIPES_LIMIT = 6
+MAX_SIMILAR_RECIPES_LIMIT = 30
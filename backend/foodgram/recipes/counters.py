@@ -0,0 +1,82 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.signals import m2m_changed
+from django.dispatch import receiver
+
+from .models import Recipe
+
+
+User = get_user_model()
+
+# Счетчик рецепта и связь пользователей, по которой он считается.
+COUNTED_RELATIONS = {
+    "favorite_count": User.favorite_recipes,
+    "cart_count": User.shopping_cart,
+}
+
+
+def _count_subquery(relation):
+    through = relation.through
+    return Coalesce(
+        Subquery(
+            through.objects.filter(recipe_id=OuterRef("pk"))
+            .order_by()
+            .values("recipe_id")
+            .annotate(total=Count("*"))
+            .values("total"),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def reconcile_recipe_counters(fix=True):
+    """
+    Сверяет счетчики рецептов с таблицами связей.
+    Возвращает {счетчик: число расходящихся рецептов}.
+    """
+    drift = {}
+    for field_name, relation in COUNTED_RELATIONS.items():
+        drifted = Recipe.objects.annotate(
+            actual=_count_subquery(relation)
+        ).exclude(**{field_name: F("actual")})
+        drift[field_name] = drifted.count()
+        if fix and drift[field_name]:
+            Recipe.objects.filter(
+                pk__in=drifted.values("pk")
+            ).update(**{field_name: _count_subquery(relation)})
+    return drift
+
+
+def _update_counter(field_name, forward_name, reverse_name,
+                    instance, action, reverse, pk_set):
+    if action == "post_add":
+        changed, step = pk_set, 1
+    elif action in ("pre_remove", "pre_clear"):
+        related = getattr(instance, reverse_name if reverse else forward_name)
+        if pk_set is not None:
+            related = related.filter(pk__in=pk_set)
+        changed, step = list(related.values_list("pk", flat=True)), -1
+    else:
+        return
+    if not changed:
+        return
+    if reverse:
+        recipes = Recipe.objects.filter(pk=instance.pk)
+        step *= len(changed)
+    else:
+        recipes = Recipe.objects.filter(pk__in=changed)
+    recipes.update(**{field_name: Greatest(F(field_name) + step, 0)})
+
+
+@receiver(m2m_changed, sender=User.favorite_recipes.through)
+def update_favorite_count(instance, action, reverse, pk_set, **kwargs):
+    _update_counter("favorite_count", "favorite_recipes", "users_favorited",
+                    instance, action, reverse, pk_set)
+
+
+@receiver(m2m_changed, sender=User.shopping_cart.through)
+def update_cart_count(instance, action, reverse, pk_set, **kwargs):
+    _update_counter("cart_count", "shopping_cart", "who_added_to_cart",
+                    instance, action, reverse, pk_set)
@@ -0,0 +1,41 @@
+from collections import defaultdict
+from threading import local
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from .models import Recipe
+
+
+# Рецепты, ожидающие обновления: {(алиас базы, update): идентификаторы}.
+# Соединения Django привязаны к потоку, поэтому хватает данных потока.
+_pending = local()
+
+
+def _get_pending():
+    if not hasattr(_pending, "recipe_ids"):
+        _pending.recipe_ids = defaultdict(set)
+    return _pending.recipe_ids
+
+
+def _flush(key):
+    recipe_ids = _get_pending().pop(key, None)
+    if recipe_ids:
+        update = key[1]
+        update(Recipe.objects.using(key[0]).filter(pk__in=recipe_ids))
+
+
+def on_commit_for_recipes(update, recipe_ids, using=None):
+    """
+    Вызывает update(выборка рецептов) после коммита один раз за
+    транзакцию для всех рецептов, переданных за это время. Так
+    удаление N строк состава рецепта не дает N отдельных пересчетов.
+
+    Каждый вызов регистрирует свой обработчик on_commit, но пересчет
+    выполняет первый из них: он забирает все накопленные идентификаторы,
+    остальные ничего не делают. Если транзакцию откатили, ее рецепты
+    пересчитаются вместе со следующей; update считает данные заново
+    из базы, поэтому лишний пересчет безвреден.
+    """
+    key = (using or DEFAULT_DB_ALIAS, update)
+    _get_pending()[key].update(recipe_ids)
+    transaction.on_commit(lambda: _flush(key), using)
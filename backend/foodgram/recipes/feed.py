@@ -0,0 +1,159 @@
+from heapq import merge
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .constants import FEED_BACKFILL_SIZE
+from .models import Follow, Recipe, TimelineEntry
+
+
+def get_fanout_limit():
+    return getattr(settings, "FEED_FANOUT_LIMIT", 1000)
+
+
+def fan_out_recipes(recipes, batch_size=1000):
+    """
+    Раскладывает рецепты по лентам подписчиков их авторов (рассылка
+    при записи). Рецепты авторов, у которых подписчиков больше
+    FEED_FANOUT_LIMIT, не рассылаются: лента подмешивает их при чтении.
+    """
+    limit = get_fanout_limit()
+    by_author = {}
+    for recipe in recipes:
+        by_author.setdefault(recipe.author_id, []).append(recipe)
+    fanned_out = set()
+    for author_id, author_recipes in by_author.items():
+        followers = list(
+            Follow.objects.filter(following_id=author_id)
+            .order_by().values_list("user_id", flat=True)[:limit + 1]
+        )
+        if len(followers) > limit:
+            continue
+        TimelineEntry.objects.bulk_create(
+            [
+                TimelineEntry(user_id=user_id, recipe_id=recipe.pk,
+                              author_id=author_id, pub_date=recipe.pub_date)
+                for recipe in author_recipes
+                for user_id in followers
+            ],
+            batch_size=batch_size,
+            ignore_conflicts=True,
+        )
+        fanned_out.update(recipe.pk for recipe in author_recipes)
+    Recipe.objects.filter(pk__in=fanned_out).update(fanned_out=True)
+    for recipe in recipes:
+        recipe.fanned_out = recipe.pk in fanned_out
+
+
+def fan_out_recipe(recipe):
+    fan_out_recipes([recipe])
+
+
+def backfill_timeline(user_id, author_id):
+    """Добавляет в ленту нового подписчика последние рецепты автора"""
+    recipes = Recipe.objects.filter(
+        author_id=author_id, fanned_out=True
+    ).order_by("-pub_date", "-id").values_list("id", "pub_date")
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=user_id, recipe_id=recipe_id,
+                          author_id=author_id, pub_date=pub_date)
+            for recipe_id, pub_date in recipes[:FEED_BACKFILL_SIZE]
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def _before(position, date_field, id_field):
+    if position is None:
+        return Q()
+    pub_date, recipe_id = position
+    return Q(**{f"{date_field}__lt": pub_date}) | Q(
+        **{date_field: pub_date, f"{id_field}__lt": recipe_id})
+
+
+class UserFeed:
+    """
+    Лента рецептов авторов, на которых подписан пользователь.
+
+    Рецепты обычных авторов лежат в таблице TimelineEntry, рецепты
+    популярных авторов (fanned_out=False) выбираются при чтении через
+    подписки. Обе выборки идут по индексам в порядке (pub_date, id)
+    с LIMIT, поэтому время чтения страницы не растет вместе
+    с числом подписок и размером ленты.
+    """
+
+    def __init__(self, user, queryset=None):
+        self.user = user
+        self.queryset = Recipe.objects.all() if queryset is None else queryset
+
+    def pushed_positions(self, limit, before=None):
+        """Позиции рецептов, разосланных в TimelineEntry пользователя"""
+        return TimelineEntry.objects.filter(
+            _before(before, "pub_date", "recipe_id"), user=self.user,
+        ).order_by("-pub_date", "-recipe_id").values_list(
+            "pub_date", "recipe_id")[:limit]
+
+    def pulled_positions(self, limit, before=None):
+        """Позиции рецептов популярных авторов из подписок"""
+        return Recipe.objects.filter(
+            _before(before, "pub_date", "id"),
+            author__in=Follow.objects.filter(
+                user=self.user).values("following_id"),
+            fanned_out=False,
+        ).order_by("-pub_date", "-id").values_list("pub_date", "id")[:limit]
+
+    def positions(self, limit, before=None):
+        """Пары (pub_date, id) рецептов ленты, не больше limit"""
+        positions = []
+        seen = set()
+        for pub_date, recipe_id in merge(
+            self.pushed_positions(limit, before),
+            self.pulled_positions(limit, before),
+            reverse=True,
+        ):
+            if recipe_id not in seen:
+                seen.add(recipe_id)
+                positions.append((pub_date, recipe_id))
+        return positions[:limit]
+
+    def page(self, limit, before=None):
+        """Рецепты ленты начиная с позиции before, новые первыми"""
+        recipe_ids = [
+            recipe_id for _, recipe_id in self.positions(limit, before)]
+        recipes = self.queryset.in_bulk(recipe_ids)
+        return [
+            recipes[recipe_id] for recipe_id in recipe_ids
+            if recipe_id in recipes
+        ]
+
+
+@transaction.atomic
+def rebuild_timelines(batch_size=1000):
+    """Заново рассылает все рецепты по лентам подписчиков"""
+    TimelineEntry.objects.all().delete()
+    Recipe.objects.filter(fanned_out=True).update(fanned_out=False)
+    queryset = Recipe.objects.only("id", "author_id", "pub_date")
+    last_id = 0
+    while True:
+        recipes = list(
+            queryset.filter(pk__gt=last_id).order_by("pk")[:batch_size])
+        if not recipes:
+            break
+        fan_out_recipes(recipes, batch_size=batch_size)
+        last_id = recipes[-1].pk
+
+
+@receiver(post_save, sender=Follow)
+def fill_timeline_on_follow(instance, created, **kwargs):
+    if created:
+        backfill_timeline(instance.user_id, instance.following_id)
+
+
+@receiver(post_delete, sender=Follow)
+def clear_timeline_on_unfollow(instance, **kwargs):
+    TimelineEntry.objects.filter(
+        user_id=instance.user_id, author_id=instance.following_id).delete()
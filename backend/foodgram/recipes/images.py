@@ -0,0 +1,166 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from PIL import Image, ImageOps
+
+from .constants import IMAGE_FORMATS, MAX_IMAGE_PIXELS, THUMBNAIL_SIZES
+from .models import Recipe
+
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+}
+# Фон для прозрачных картинок в форматах без альфа-канала.
+THUMBNAIL_BACKGROUND = (255, 255, 255)
+
+_executor = None
+
+
+def validate_image(file):
+    """
+    Проверяет заголовок изображения до полного декодирования:
+    формат и количество пикселей.
+    """
+    position = file.tell()
+    try:
+        with Image.open(file) as image:
+            image_format = image.format
+            width, height = image.size
+    except (OSError, Image.DecompressionBombError):
+        raise ValidationError("Upload a valid image.")
+    finally:
+        file.seek(position)
+    if image_format not in IMAGE_FORMATS:
+        raise ValidationError(f"Unsupported image format: {image_format}.")
+    if width * height > MAX_IMAGE_PIXELS:
+        raise ValidationError(
+            f"Image is too large: {width}x{height} pixels.")
+
+
+def _thumbnail_name(source_name, size_name, extension):
+    directory, filename = os.path.split(source_name)
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(
+        directory, "thumbnails", f"{stem}_{size_name}.{extension}")
+
+
+def _convert_for_format(image, image_format):
+    """
+    Приводит RGBA-картинку к режиму формата: WebP хранит прозрачность,
+    для JPEG прозрачные места заливаются THUMBNAIL_BACKGROUND.
+    """
+    if image.mode == "RGB" or image_format == "WEBP":
+        return image
+    flattened = Image.new("RGB", image.size, THUMBNAIL_BACKGROUND)
+    flattened.paste(image, mask=image.getchannel("A"))
+    return flattened
+
+
+def build_thumbnails(image_field):
+    """
+    Уменьшает изображение до размеров THUMBNAIL_SIZES и сохраняет
+    каждый размер в WebP и JPEG. Возвращает описание для
+    Recipe.thumbnails.
+    """
+    storage = image_field.storage
+    with image_field.open("rb") as file:
+        with Image.open(file) as image:
+            image = ImageOps.exif_transpose(image)
+            has_alpha = (
+                image.mode in ("RGBA", "LA", "PA")
+                or "transparency" in image.info
+            )
+            image = image.convert("RGBA" if has_alpha else "RGB")
+    thumbnails = {"source": image_field.name}
+    for size_name, max_side in THUMBNAIL_SIZES.items():
+        resized = image.copy()
+        resized.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+        thumbnails[size_name] = {}
+        for extension, (image_format, options) in THUMBNAIL_FORMATS.items():
+            buffer = BytesIO()
+            _convert_for_format(resized, image_format).save(
+                buffer, image_format, **options)
+            thumbnails[size_name][extension] = storage.save(
+                _thumbnail_name(image_field.name, size_name, extension),
+                ContentFile(buffer.getvalue()),
+            )
+    return thumbnails
+
+
+def generate_recipe_thumbnails(recipe_id):
+    recipe = Recipe.objects.filter(pk=recipe_id).first()
+    if recipe is None or not recipe.image:
+        return
+    if recipe.thumbnails.get("source") == recipe.image.name:
+        return
+    storage = recipe.image.storage
+    thumbnails = build_thumbnails(recipe.image)
+    with transaction.atomic():
+        recipe = Recipe.objects.select_for_update().filter(
+            pk=recipe_id).first()
+        if recipe is None or recipe.image.name != thumbnails["source"]:
+            # Картинку успели заменить или рецепт удалили.
+            stale, thumbnails = thumbnails, {}
+        else:
+            stale = recipe.thumbnails
+            recipe.thumbnails = thumbnails
+            recipe.save(update_fields=["thumbnails"])
+        transaction.on_commit(
+            lambda: delete_thumbnails(storage, stale, keep=thumbnails))
+
+
+def _thumbnail_files(thumbnails):
+    return {
+        name
+        for size_name in THUMBNAIL_SIZES
+        for name in thumbnails.get(size_name, {}).values()
+    }
+
+
+def delete_thumbnails(storage, thumbnails, keep=None):
+    """Удаляет файлы миниатюр из описания thumbnails, кроме файлов keep"""
+    for name in _thumbnail_files(thumbnails) - _thumbnail_files(keep or {}):
+        storage.delete(name)
+
+
+def _run_in_background(function, *args):
+    close_old_connections()
+    try:
+        function(*args)
+    except Exception:
+        logger.exception("Thumbnail generation failed for %s", args)
+    finally:
+        close_old_connections()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, "IMAGE_PROCESSING_WORKERS", 2),
+            thread_name_prefix="thumbnails",
+        )
+    return _executor
+
+
+@receiver(post_save, sender=Recipe)
+def schedule_recipe_thumbnails(instance, update_fields, **kwargs):
+    if update_fields is not None and "image" not in update_fields:
+        return
+    if not instance.image:
+        return
+    if instance.thumbnails.get("source") == instance.image.name:
+        return
+    transaction.on_commit(lambda: get_executor().submit(
+        _run_in_background, generate_recipe_thumbnails, instance.pk))
@@ -0,0 +1,93 @@
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.contrib.postgres.fields import ArrayField
+from django.db import transaction
+from django.db.models import (
+    BigIntegerField,
+    F,
+    FloatField,
+    Func,
+    IntegerField,
+    OuterRef,
+    Subquery,
+    Value,
+)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast, Coalesce
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .deferred import on_commit_for_recipes
+from .models import Ingredient, Recipe, RecipeIngredient
+
+
+def get_ingredient_ids_subquery():
+    """Отсортированные идентификаторы ингредиентов рецепта из связей"""
+    return Coalesce(
+        Subquery(
+            RecipeIngredient.objects.filter(recipe_id=OuterRef("pk"))
+            .order_by()
+            .values("recipe_id")
+            .annotate(ids=ArrayAgg("ingredient_id", distinct=True,
+                                   ordering="ingredient_id"))
+            .values("ids")
+        ),
+        Value([]),
+        output_field=ArrayField(BigIntegerField()),
+    )
+
+
+def update_recipe_ingredient_ids(recipes):
+    """Пересчитывает ingredient_ids рецептов из выборки recipes"""
+    recipes.update(ingredient_ids=get_ingredient_ids_subquery())
+
+
+def set_recipe_ingredient_ids(recipe, ingredient_ids):
+    """Сохраняет известный набор ингредиентов рецепта без пересчета"""
+    recipe.ingredient_ids = sorted(set(ingredient_ids))
+    Recipe.objects.filter(pk=recipe.pk).update(
+        ingredient_ids=recipe.ingredient_ids)
+
+
+def match_recipes(queryset, ingredient_ids, fully_covered=False):
+    """
+    Рецепты, в которых есть хотя бы один из ингредиентов ingredient_ids,
+    по убыванию доли ингредиентов рецепта, которые есть у пользователя.
+    С fully_covered остаются только рецепты, для которых есть все.
+
+    Кандидаты выбираются по GIN-индексу на Recipe.ingredient_ids
+    (инвертированный индекс ингредиент -> рецепты), без соединения
+    с RecipeIngredient и группировки.
+    """
+    ingredient_ids = sorted(set(ingredient_ids))
+    queryset = queryset.filter(ingredient_ids__overlap=ingredient_ids)
+    if fully_covered:
+        queryset = queryset.filter(ingredient_ids__contained_by=ingredient_ids)
+    matched_count = RawSQL(
+        f"SELECT COUNT(*) FROM unnest({Recipe._meta.db_table}.ingredient_ids)"
+        " AS ingredient_id WHERE ingredient_id = ANY(%s)",
+        (ingredient_ids,),
+        output_field=IntegerField(),
+    )
+    return queryset.alias(
+        matched_count=matched_count,
+        coverage=Cast(matched_count, FloatField()) / Func(
+            F("ingredient_ids"), function="CARDINALITY",
+            output_field=IntegerField()),
+    ).order_by("-coverage", "-matched_count", *Recipe._meta.ordering)
+
+
+def _update_after_commit(recipes):
+    transaction.on_commit(lambda: update_recipe_ingredient_ids(recipes))
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def update_ingredient_ids_on_change(instance, **kwargs):
+    # Изменения из админки; сериализатор рецептов обновляет набор сам.
+    on_commit_for_recipes(update_recipe_ingredient_ids, [instance.recipe_id])
+
+
+@receiver(post_delete, sender=Ingredient)
+def update_ingredient_ids_on_ingredient_delete(instance, **kwargs):
+    _update_after_commit(
+        Recipe.objects.filter(ingredient_ids__contains=[instance.pk]))
@@ -0,0 +1,95 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, F, FloatField, Q
+from django.db.models.functions import Cast
+
+from recipes.ingredient_match import match_recipes
+from recipes.models import Ingredient, Recipe
+
+
+def naive_match_recipes(queryset, ingredient_ids, fully_covered=False):
+    """Тот же отбор через соединение с RecipeIngredient и GROUP BY/HAVING"""
+    queryset = queryset.annotate(
+        matched_count=Count(
+            "ingredient_amounts",
+            filter=Q(ingredient_amounts__ingredient_id__in=ingredient_ids),
+        ),
+        total_count=Count("ingredient_amounts"),
+    ).filter(matched_count__gt=0)
+    if fully_covered:
+        queryset = queryset.filter(matched_count=F("total_count"))
+    return queryset.annotate(
+        coverage=Cast("matched_count", FloatField())
+        / Cast("total_count", FloatField()),
+    ).order_by("-coverage", "-matched_count", *Recipe._meta.ordering)
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает подбор рецептов по имеющимся ингредиентам через "
+        "индекс Recipe.ingredient_ids с запросом GROUP BY/HAVING "
+        "по RecipeIngredient. Запускать на базе с тестовыми данными."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--ingredients",
+            help="Идентификаторы ингредиентов через запятую. "
+                 "По умолчанию выбираются случайно.",
+        )
+        parser.add_argument(
+            "--count", type=int, default=5,
+            help="Сколько случайных ингредиентов выбрать.",
+        )
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--limit", type=int, default=6)
+        parser.add_argument("--fully-covered", action="store_true")
+
+    def handle(self, *args, ingredients=None, count=5, repeat=20, limit=6,
+               fully_covered=False, **options):
+        if ingredients:
+            try:
+                ingredient_ids = [
+                    int(ingredient_id)
+                    for ingredient_id in ingredients.split(",")
+                ]
+            except ValueError:
+                raise CommandError("--ingredients must be integer ids.")
+        else:
+            used_ids = list(
+                Ingredient.objects.filter(recipes__isnull=False)
+                .values_list("id", flat=True).distinct())
+            if not used_ids:
+                raise CommandError("No recipes with ingredients found.")
+            ingredient_ids = random.sample(
+                used_ids, min(count, len(used_ids)))
+        self.stdout.write(f"Ingredients: {ingredient_ids}")
+        results = {}
+        for label, build_queryset in (
+            ("index", match_recipes),
+            ("group_by", naive_match_recipes),
+        ):
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                queryset = build_queryset(
+                    Recipe.objects.all(), ingredient_ids, fully_covered)
+                total = queryset.count()
+                page = list(queryset.values_list("id", flat=True)[:limit])
+                timings.append((time.perf_counter() - started) * 1000)
+            results[label] = (total, page)
+            timings.sort()
+            self.stdout.write(
+                f"{label}: {total} recipes, "
+                f"median {statistics.median(timings):.1f} ms, "
+                f"p95 {timings[int(len(timings) * 0.95) - 1]:.1f} ms"
+            )
+        if results["index"] != results["group_by"]:
+            raise CommandError(
+                f"Results differ: index {results['index']}, "
+                f"group_by {results['group_by']}"
+            )
+        self.stdout.write(self.style.SUCCESS("Results match."))
@@ -0,0 +1,95 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.models import Recipe
+from recipes.similarity import rank_by_similarity, similar_recipes
+
+
+def exact_similar_recipes(queryset, recipe):
+    """
+    Точный ответ: коэффициент Жаккара для всех рецептов, у которых
+    есть хотя бы один общий ингредиент с recipe.
+    """
+    return rank_by_similarity(
+        queryset.filter(ingredient_ids__overlap=recipe.ingredient_ids)
+        .exclude(pk=recipe.pk),
+        recipe.ingredient_ids,
+    )
+
+
+def jaccard(first, second):
+    return len(first & second) / len(first | second)
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает поиск похожих рецептов через LSH-корзины с точным "
+        "расчетом коэффициента Жаккара: полноту первых --limit "
+        "результатов, число кандидатов и время запроса. Запускать "
+        "на базе с тестовыми данными."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sample", type=int, default=50,
+            help="Сколько случайных рецептов проверить.",
+        )
+        parser.add_argument("--limit", type=int, default=6)
+        parser.add_argument("--seed", type=int, default=None)
+
+    def handle(self, *args, sample=50, limit=6, seed=None, **options):
+        ingredient_sets = {
+            recipe_id: set(ingredient_ids)
+            for recipe_id, ingredient_ids in Recipe.objects.exclude(
+                ingredient_ids=[]).values_list("id", "ingredient_ids")
+        }
+        if not ingredient_sets:
+            raise CommandError("No recipes with ingredients found.")
+        recipe_ids = random.Random(seed).sample(
+            sorted(ingredient_sets), min(sample, len(ingredient_sets)))
+        timings = {"lsh": [], "exact": []}
+        candidates = {"lsh": [], "exact": []}
+        recalls = []
+        for recipe in Recipe.objects.filter(pk__in=recipe_ids):
+            results = {}
+            for label, build_queryset in (
+                ("lsh", similar_recipes),
+                ("exact", exact_similar_recipes),
+            ):
+                started = time.perf_counter()
+                queryset = build_queryset(Recipe.objects.all(), recipe)
+                results[label] = list(
+                    queryset.values_list("id", flat=True)[:limit])
+                timings[label].append(
+                    (time.perf_counter() - started) * 1000)
+                candidates[label].append(queryset.count())
+            if not results["exact"]:
+                continue
+            # Рецепты с одинаковой похожестью взаимозаменяемы, поэтому
+            # найденным считается любой не менее похожий, чем последний
+            # из точного ответа.
+            own = ingredient_sets[recipe.pk]
+            threshold = jaccard(own, ingredient_sets[results["exact"][-1]])
+            found = sum(
+                jaccard(own, ingredient_sets[recipe_id]) >= threshold
+                for recipe_id in results["lsh"]
+            )
+            recalls.append(min(found, len(results["exact"]))
+                           / len(results["exact"]))
+        for label in ("lsh", "exact"):
+            label_timings = sorted(timings[label])
+            self.stdout.write(
+                f"{label}: candidates mean "
+                f"{statistics.mean(candidates[label]):.1f}, "
+                f"median {statistics.median(label_timings):.1f} ms, "
+                f"p95 {label_timings[int(len(label_timings) * 0.95) - 1]:.1f}"
+                " ms"
+            )
+        if recalls:
+            self.stdout.write(
+                f"Recall@{limit}: mean {statistics.mean(recalls):.3f}, "
+                f"min {min(recalls):.3f} over {len(recalls)} recipes."
+            )
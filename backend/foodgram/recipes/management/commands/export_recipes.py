@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+from recipes.recipe_io import (
+    FORMATS,
+    RecordWriter,
+    detect_format,
+    iter_recipe_records,
+    open_stream,
+)
+
+
+class Command(BaseCommand):
+    help = "Выгружает рецепты в JSON Lines или CSV, не загружая их в память."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "path", help="Файл для выгрузки или '-' для stdout.")
+        parser.add_argument("--format", choices=FORMATS, dest="file_format")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--author", help="Выгрузить рецепты только этого автора (email).")
+
+    def handle(self, path, file_format=None, batch_size=1000, author=None,
+               **options):
+        recipes = Recipe.objects.all()
+        if author:
+            recipes = recipes.filter(author__email=author)
+        started = time.monotonic()
+        exported = 0
+        stream = open_stream(path, "w")
+        try:
+            writer = RecordWriter(stream, detect_format(path, file_format))
+            for record in iter_recipe_records(recipes, batch_size):
+                writer.write(record)
+                exported += 1
+        finally:
+            if path != "-":
+                stream.close()
+        elapsed = time.monotonic() - started
+        self.stderr.write(
+            f"Exported {exported} recipes in {elapsed:.1f}s "
+            f"({exported / max(elapsed, 1e-9):.0f} recipes/s)."
+        )
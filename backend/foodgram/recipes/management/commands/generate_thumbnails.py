@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import generate_recipe_thumbnails
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        "Создает уменьшенные копии картинок рецептов, для которых "
+        "их еще нет или картинка была заменена."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all", action="store_true", dest="regenerate",
+            help="Пересоздать копии для всех рецептов.",
+        )
+
+    def handle(self, *args, regenerate=False, **options):
+        recipes = Recipe.objects.exclude(image="").only(
+            "id", "image", "thumbnails")
+        processed = 0
+        for recipe in recipes.iterator():
+            if regenerate:
+                Recipe.objects.filter(pk=recipe.pk).update(thumbnails={})
+            elif recipe.thumbnails.get("source") == recipe.image.name:
+                continue
+            generate_recipe_thumbnails(recipe.pk)
+            processed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f"Thumbnails generated for {processed} recipes."))
@@ -0,0 +1,149 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.constants import (
+    MAX_COOKING_TIME,
+    MAX_INGREDIENT_AMOUNT,
+    MIN_COOKING_TIME,
+    MIN_INGREDIENT_AMOUNT,
+)
+from recipes.models import Ingredient, Recipe, RecipeIngredient
+from recipes.recipe_io import (
+    FORMATS,
+    batched,
+    detect_format,
+    open_stream,
+    read_records,
+)
+from recipes.search import update_search_vectors
+from recipes.similarity import update_similarity_buckets
+
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Загружает рецепты из JSON Lines или CSV пачками через bulk_create. "
+        "Каждая пачка записывается в отдельной транзакции."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "path", help="Файл с рецептами или '-' для stdin.")
+        parser.add_argument("--format", choices=FORMATS, dest="file_format")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--strict", action="store_true",
+            help="Прервать загрузку на первой ошибочной записи.",
+        )
+
+    def handle(self, path, file_format=None, batch_size=1000, strict=False,
+               **options):
+        self.authors = dict(User.objects.values_list("email", "id"))
+        self.ingredients = {
+            (name, measurement_unit): pk
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                "pk", "name", "measurement_unit")
+        }
+        self.strict = strict
+        self.skipped = 0
+        imported = 0
+        started = time.monotonic()
+        stream = open_stream(path, "r")
+        try:
+            records = read_records(
+                stream, detect_format(path, file_format), self.reject)
+            for batch in batched(records, batch_size):
+                imported += self.import_batch(batch, batch_size)
+                elapsed = time.monotonic() - started
+                self.stderr.write(
+                    f"{imported} recipes, "
+                    f"{imported / max(elapsed, 1e-9):.0f} recipes/s"
+                )
+        finally:
+            if path != "-":
+                stream.close()
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {imported} recipes in {elapsed:.1f}s "
+            f"({imported / max(elapsed, 1e-9):.0f} recipes/s), "
+            f"skipped {self.skipped}."
+        ))
+
+    def reject(self, record, reason):
+        if self.strict:
+            if isinstance(record, dict):
+                record = record.get("name")
+            raise CommandError(f"{reason}: {record!r}")
+        self.skipped += 1
+
+    def build_recipe(self, record):
+        try:
+            author_id = self.authors.get(record.get("author"))
+            cooking_time = int(record["cooking_time"])
+            items = [
+                (item["name"], item["measurement_unit"], int(item["amount"]))
+                for item in record["ingredients"]
+            ]
+            fields = {
+                name: record[name] for name in ("name", "text", "image")}
+        except (KeyError, TypeError, ValueError):
+            return self.reject(record, "Malformed record")
+        if author_id is None:
+            return self.reject(record, "Unknown author")
+        for name, value in fields.items():
+            if not isinstance(value, str) or not value:
+                return self.reject(record, f"Missing {name}")
+            max_length = Recipe._meta.get_field(name).max_length
+            if max_length is not None and len(value) > max_length:
+                return self.reject(record, f"Too long {name}")
+        if not MIN_COOKING_TIME <= cooking_time <= MAX_COOKING_TIME:
+            return self.reject(record, "Invalid cooking time")
+        amounts = {}
+        for name, measurement_unit, amount in items:
+            ingredient_id = self.ingredients.get((name, measurement_unit))
+            if ingredient_id is None:
+                return self.reject(record, "Unknown ingredient")
+            if ingredient_id in amounts:
+                return self.reject(record, "Duplicate ingredient")
+            if not MIN_INGREDIENT_AMOUNT <= amount <= MAX_INGREDIENT_AMOUNT:
+                return self.reject(record, "Invalid ingredient amount")
+            amounts[ingredient_id] = amount
+        if not amounts:
+            return self.reject(record, "No ingredients")
+        recipe = Recipe(
+            author_id=author_id,
+            cooking_time=cooking_time,
+            ingredient_ids=sorted(amounts),
+            **fields,
+        )
+        return recipe, list(amounts.items())
+
+    def import_batch(self, records, batch_size):
+        built = [
+            recipe for recipe in map(self.build_recipe, records) if recipe
+        ]
+        with transaction.atomic():
+            recipes = Recipe.objects.bulk_create(
+                [recipe for recipe, _ in built], batch_size=batch_size)
+            RecipeIngredient.objects.bulk_create(
+                [
+                    RecipeIngredient(recipe_id=recipe.pk,
+                                     ingredient_id=ingredient_id,
+                                     amount=amount)
+                    for recipe, (_, amounts) in zip(recipes, built)
+                    for ingredient_id, amount in amounts
+                ],
+                batch_size=batch_size,
+            )
+            # bulk_create не отправляет сигналы, поэтому поисковый
+            # вектор и LSH-корзины заполняются здесь.
+            imported = Recipe.objects.filter(
+                pk__in=[recipe.pk for recipe in recipes])
+            update_search_vectors(imported)
+            update_similarity_buckets(imported)
+        return len(recipes)
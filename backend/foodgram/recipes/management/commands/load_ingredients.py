@@ -0,0 +1,85 @@
+import csv
+import io
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from recipes.models import Ingredient
+
+
+class Command(BaseCommand):
+    help = (
+        "Загружает ингредиенты из CSV (название,единица) или JSON. "
+        "Уже существующие ингредиенты пропускаются, поэтому повторный "
+        "запуск ничего не меняет."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "path", help="Путь к ingredients.csv или ingredients.json.")
+
+    def handle(self, path, **options):
+        started = time.monotonic()
+        try:
+            rows = self.read_rows(path)
+        except (OSError, ValueError, KeyError) as error:
+            raise CommandError(f"Cannot read {path}: {error}")
+        with transaction.atomic():
+            if connection.vendor == "postgresql":
+                created = self.copy_rows(rows)
+            else:
+                created = self.bulk_create_rows(rows)
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Loaded {created} new ingredients of {len(rows)} "
+            f"in {elapsed:.2f}s."
+        ))
+
+    def read_rows(self, path):
+        with open(path, encoding="utf-8", newline="") as file:
+            if path.endswith(".csv"):
+                return [tuple(row) for row in csv.reader(file) if row]
+            return [
+                (fields["name"], fields["measurement_unit"])
+                for fields in (
+                    item.get("fields", item) for item in json.load(file)
+                )
+            ]
+
+    def copy_rows(self, rows):
+        """COPY во временную таблицу и INSERT ... ON CONFLICT DO NOTHING"""
+        table = Ingredient._meta.db_table
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "CREATE TEMPORARY TABLE ingredient_staging "
+                "(position serial, name text, measurement_unit text) "
+                "ON COMMIT DROP"
+            )
+            cursor.cursor.copy_expert(
+                "COPY ingredient_staging (name, measurement_unit) "
+                "FROM STDIN WITH (FORMAT csv)",
+                buffer,
+            )
+            cursor.execute(
+                f"INSERT INTO {table} (name, measurement_unit) "
+                f"SELECT name, measurement_unit FROM ingredient_staging "
+                f"ORDER BY position "
+                f"ON CONFLICT (name, measurement_unit) DO NOTHING"
+            )
+            return cursor.rowcount
+
+    def bulk_create_rows(self, rows):
+        before = Ingredient.objects.count()
+        Ingredient.objects.bulk_create(
+            [
+                Ingredient(name=name, measurement_unit=measurement_unit)
+                for name, measurement_unit in rows
+            ],
+            ignore_conflicts=True,
+        )
+        return Ingredient.objects.count() - before
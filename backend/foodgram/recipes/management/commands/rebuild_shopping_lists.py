@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.shopping_list import (
+    compute_shopping_lists,
+    get_stored_shopping_lists,
+    rebuild_shopping_lists,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересобирает списки покупок по корзинам пользователей "
+        "и сверяет их с расчетом по рецептам."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verify-only",
+            action="store_true",
+            help="Только сверить списки, не пересобирая их.",
+        )
+        parser.add_argument(
+            "--user", type=int, action="append", dest="user_ids",
+            help="ID пользователя (можно указать несколько раз).",
+        )
+
+    def handle(self, *args, verify_only=False, user_ids=None, **options):
+        if not verify_only:
+            rebuild_shopping_lists(user_ids)
+            self.stdout.write("Shopping lists rebuilt.")
+        expected = compute_shopping_lists(user_ids)
+        stored = get_stored_shopping_lists(user_ids)
+        mismatched = sorted(
+            user_id for user_id in expected.keys() | stored.keys()
+            if expected.get(user_id, {}) != stored.get(user_id, {})
+        )
+        if mismatched:
+            raise CommandError(
+                f"Shopping lists differ for users: "
+                f"{', '.join(map(str, mismatched))}"
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"Shopping lists verified for {len(expected)} users."
+        ))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import SimilarityBucket
+from recipes.similarity import rebuild_similarity_buckets
+
+
+class Command(BaseCommand):
+    help = (
+        "Заново строит MinHash-подписи и LSH-корзины всех рецептов "
+        "для поиска похожих, например после изменения MINHASH_BANDS "
+        "или MINHASH_BAND_ROWS."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, batch_size=1000, **options):
+        rebuild_similarity_buckets(batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(
+            "Similarity index rebuilt: "
+            f"{SimilarityBucket.objects.count()} buckets."
+        ))
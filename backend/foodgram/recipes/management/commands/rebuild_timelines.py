@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from recipes.feed import rebuild_timelines
+from recipes.models import TimelineEntry
+
+
+class Command(BaseCommand):
+    help = (
+        "Заново раскладывает все рецепты по лентам подписчиков, например "
+        "после импорта рецептов или изменения FEED_FANOUT_LIMIT."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, batch_size=1000, **options):
+        rebuild_timelines(batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(
+            f"Timelines rebuilt: {TimelineEntry.objects.count()} entries."
+        ))
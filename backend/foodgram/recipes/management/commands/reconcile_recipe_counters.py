@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from recipes.counters import reconcile_recipe_counters
+
+
+class Command(BaseCommand):
+    help = (
+        "Сверяет счетчики избранного и списков покупок у рецептов "
+        "с таблицами связей и исправляет расхождения. "
+        "Предназначена для ежедневного запуска по расписанию."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Только посчитать расхождения, не исправляя их.",
+        )
+
+    def handle(self, *args, dry_run=False, **options):
+        drift = reconcile_recipe_counters(fix=not dry_run)
+        for field_name, drifted in drift.items():
+            self.stdout.write(f"{field_name}: {drifted} recipes drifted")
+        if not dry_run:
+            self.stdout.write(self.style.SUCCESS("Recipe counters reconciled."))
@@ -0,0 +1,219 @@
+import random
+import time
+from io import BytesIO
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from PIL import Image
+
+from recipes.counters import reconcile_recipe_counters
+from recipes.feed import rebuild_timelines
+from recipes.models import Follow, Ingredient, Recipe, RecipeIngredient
+from recipes.recipe_io import batched
+from recipes.search import update_search_vectors
+from recipes.shopping_list import rebuild_shopping_lists
+from recipes.similarity import update_similarity_buckets
+
+
+User = get_user_model()
+
+USERNAME_PREFIX = "bench_"
+PLACEHOLDER_IMAGE = "recipes/benchmark.png"
+
+
+def zipf_weights(count, exponent=1.1):
+    """Накопленные веса, при которых первые элементы встречаются чаще"""
+    return list(accumulate(1 / (rank + 1) ** exponent
+                           for rank in range(count)))
+
+
+class Command(BaseCommand):
+    help = (
+        "Заполняет базу синтетическими пользователями, рецептами, "
+        "избранным, списками покупок и подписками для бенчмарков. "
+        "Популярность авторов, рецептов и ингредиентов распределена "
+        "по Ципфу; при одинаковом --seed данные совпадают."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--recipes", type=int, default=10000)
+        parser.add_argument(
+            "--favorites", type=float, default=20,
+            help="Среднее число рецептов в избранном у пользователя.",
+        )
+        parser.add_argument(
+            "--cart", type=float, default=5,
+            help="Среднее число рецептов в списке покупок.",
+        )
+        parser.add_argument(
+            "--follows", type=float, default=10,
+            help="Среднее число подписок у пользователя.",
+        )
+        parser.add_argument("--max-ingredients", type=int, default=12)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--clear", action="store_true",
+            help="Удалить ранее созданные тестовые данные.",
+        )
+
+    def handle(self, *args, users=1000, recipes=10000, favorites=20,
+               cart=5, follows=10, max_ingredients=12, seed=42,
+               batch_size=1000, clear=False, **options):
+        if users < 1 or recipes < 1 or max_ingredients < 1:
+            raise CommandError(
+                "--users, --recipes and --max-ingredients must be positive.")
+        bench_users = User.objects.filter(username__startswith=USERNAME_PREFIX)
+        if clear:
+            bench_users.delete()
+        elif bench_users.exists():
+            raise CommandError(
+                "Benchmark data already exists, use --clear to replace it.")
+        ingredients = list(
+            Ingredient.objects.order_by("id").values_list("id", "name"))
+        if not ingredients:
+            raise CommandError("Load ingredients first.")
+
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        started = time.monotonic()
+        self.save_placeholder_image()
+        user_ids = self.create_users(users)
+        # Авторы и ингредиенты перемешиваются, чтобы популярность
+        # не зависела от порядка в базе.
+        authors = user_ids[:]
+        self.rng.shuffle(authors)
+        self.rng.shuffle(ingredients)
+        recipe_ids = self.create_recipes(
+            recipes, authors, ingredients, max_ingredients)
+        self.create_relations(user_ids, recipe_ids, favorites, cart)
+        self.create_follows(user_ids, authors, follows)
+        reconcile_recipe_counters(fix=True)
+        rebuild_shopping_lists(user_ids, batch_size=batch_size)
+        rebuild_timelines(batch_size=batch_size)
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(user_ids)} users and {len(recipe_ids)} recipes "
+            f"in {time.monotonic() - started:.1f}s."
+        ))
+
+    def save_placeholder_image(self):
+        if default_storage.exists(PLACEHOLDER_IMAGE):
+            return
+        buffer = BytesIO()
+        Image.new("RGB", (64, 64), (230, 150, 60)).save(buffer, "PNG")
+        default_storage.save(PLACEHOLDER_IMAGE, ContentFile(buffer.getvalue()))
+
+    def create_users(self, count):
+        password = make_password("benchmark")
+        for batch in batched(range(count), self.batch_size):
+            User.objects.bulk_create(
+                User(
+                    username=f"{USERNAME_PREFIX}{number}",
+                    email=f"{USERNAME_PREFIX}{number}@example.com",
+                    first_name="Bench",
+                    last_name=str(number),
+                    password=password,
+                )
+                for number in batch
+            )
+        return list(
+            User.objects.filter(username__startswith=USERNAME_PREFIX)
+            .order_by("id").values_list("id", flat=True)
+        )
+
+    def create_recipes(self, count, authors, ingredients, max_ingredients):
+        rng = self.rng
+        author_weights = zipf_weights(len(authors))
+        ingredient_weights = zipf_weights(len(ingredients))
+        recipe_ids = []
+        for batch in batched(range(count), self.batch_size):
+            built = []
+            for _ in batch:
+                size = rng.randint(1, min(max_ingredients, len(ingredients)))
+                chosen = {}
+                while len(chosen) < size:
+                    ingredient_id, name = rng.choices(
+                        ingredients, cum_weights=ingredient_weights)[0]
+                    chosen[ingredient_id] = name
+                names = list(chosen.values())
+                recipe = Recipe(
+                    author_id=rng.choices(
+                        authors, cum_weights=author_weights)[0],
+                    name=(f"{names[0].capitalize()} с {names[-1]}"
+                          if size > 1 else names[0].capitalize())[:256],
+                    text="Смешать " + ", ".join(names) + ".",
+                    cooking_time=rng.randint(5, 180),
+                    image=PLACEHOLDER_IMAGE,
+                    ingredient_ids=sorted(chosen),
+                )
+                built.append(recipe)
+            with transaction.atomic():
+                created = Recipe.objects.bulk_create(built)
+                RecipeIngredient.objects.bulk_create(
+                    [
+                        RecipeIngredient(
+                            recipe_id=recipe.pk, ingredient_id=ingredient_id,
+                            amount=rng.randint(1, 500))
+                        for recipe in created
+                        for ingredient_id in recipe.ingredient_ids
+                    ],
+                    batch_size=self.batch_size,
+                )
+                batch_ids = [recipe.pk for recipe in created]
+                update_search_vectors(Recipe.objects.filter(pk__in=batch_ids))
+                update_similarity_buckets(Recipe.objects.filter(pk__in=batch_ids))
+            recipe_ids.extend(batch_ids)
+            self.stderr.write(f"{len(recipe_ids)} recipes")
+        return recipe_ids
+
+    def _sample(self, population, weights, mean):
+        count = min(len(population), int(self.rng.expovariate(1 / mean)))
+        chosen = set()
+        while len(chosen) < count:
+            chosen.add(self.rng.choices(population, cum_weights=weights)[0])
+        return chosen
+
+    def create_relations(self, user_ids, recipe_ids, favorites, cart):
+        popular = recipe_ids[:]
+        self.rng.shuffle(popular)
+        weights = zipf_weights(len(popular))
+        for relation, mean in (
+            (User.favorite_recipes, favorites),
+            (User.shopping_cart, cart),
+        ):
+            through = relation.through
+            if mean <= 0:
+                continue
+            for batch in batched(user_ids, self.batch_size):
+                through.objects.bulk_create(
+                    [
+                        through(myuser_id=user_id, recipe_id=recipe_id)
+                        for user_id in batch
+                        for recipe_id in self._sample(popular, weights, mean)
+                    ],
+                    batch_size=self.batch_size,
+                )
+
+    def create_follows(self, user_ids, authors, follows):
+        if follows <= 0:
+            return
+        weights = zipf_weights(len(authors))
+        for batch in batched(user_ids, self.batch_size):
+            Follow.objects.bulk_create(
+                [
+                    Follow(user_id=user_id, following_id=author_id)
+                    for user_id in batch
+                    for author_id in self._sample(authors, weights, follows)
+                    if author_id != user_id
+                ],
+                batch_size=self.batch_size,
+            )
@@ -0,0 +1,54 @@
+# Generated by Django 3.2.16 on 2026-10-18 03:59
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    User = apps.get_model('users', 'MyUser')
+    relations = {
+        'favorite_count': User.favorite_recipes.through,
+        'cart_count': User.shopping_cart.through,
+    }
+    Recipe.objects.update(**{
+        field_name: Coalesce(
+            Subquery(
+                through.objects.filter(recipe_id=OuterRef('pk'))
+                .order_by()
+                .values('recipe_id')
+                .annotate(total=Count('*'))
+                .values('total'),
+                output_field=IntegerField(),
+            ),
+            0,
+        )
+        for field_name, through in relations.items()
+    })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_shoppinglistitem'),
+        ('users', '0005_alter_myuser_shopping_cart'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='cart_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В списках покупок'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='favorite_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-favorite_count', '-pub_date'], name='recipe_favorite_count_idx'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
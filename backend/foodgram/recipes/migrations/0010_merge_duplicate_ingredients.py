@@ -0,0 +1,68 @@
+# Generated by Django 3.2.16 on 2026-10-18 04:07
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+# Предел PositiveSmallIntegerField в RecipeIngredient.amount.
+MAX_AMOUNT = 32767
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+    groups = (
+        Ingredient.objects.values('name', 'measurement_unit')
+        .annotate(keep_id=Min('id'), total=Count('id'))
+        .filter(total__gt=1)
+        .order_by()
+    )
+    for group in groups:
+        keep_id = group['keep_id']
+        duplicate_ids = list(
+            Ingredient.objects.filter(
+                name=group['name'],
+                measurement_unit=group['measurement_unit'],
+            ).exclude(id=keep_id).values_list('id', flat=True)
+        )
+        # Рецепт мог содержать несколько дублей сразу: такие строки
+        # сливаются в одну с суммой количеств до переназначения.
+        merged = {}
+        merged_ids = []
+        for item in RecipeIngredient.objects.filter(
+            ingredient_id__in=[keep_id, *duplicate_ids]
+        ).order_by('recipe_id', 'id'):
+            kept = merged.setdefault(item.recipe_id, item)
+            if kept is not item:
+                kept.amount = min(kept.amount + item.amount,
+                                  MAX_AMOUNT)
+                merged_ids.append(item.id)
+        if merged_ids:
+            RecipeIngredient.objects.bulk_update(
+                merged.values(), ['amount'])
+            RecipeIngredient.objects.filter(id__in=merged_ids).delete()
+        RecipeIngredient.objects.filter(
+            ingredient_id__in=duplicate_ids
+        ).update(ingredient_id=keep_id)
+        for item in ShoppingListItem.objects.filter(
+            ingredient_id__in=duplicate_ids
+        ):
+            kept, _ = ShoppingListItem.objects.get_or_create(
+                user_id=item.user_id, ingredient_id=keep_id,
+                defaults={'total_amount': 0},
+            )
+            kept.total_amount += item.total_amount
+            kept.save()
+        Ingredient.objects.filter(id__in=duplicate_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_recipe_thumbnails'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop),
+    ]
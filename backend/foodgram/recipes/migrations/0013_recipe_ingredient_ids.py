@@ -0,0 +1,46 @@
+# Generated by Django 3.2.16 on 2026-10-18 04:14
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.contrib.postgres.fields import ArrayField
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_ingredient_ids(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    Recipe.objects.update(ingredient_ids=Coalesce(
+        Subquery(
+            RecipeIngredient.objects.filter(recipe_id=OuterRef('pk'))
+            .order_by()
+            .values('recipe_id')
+            .annotate(ids=ArrayAgg('ingredient_id', distinct=True,
+                                   ordering='ingredient_id'))
+            .values('ids')
+        ),
+        Value([]),
+        output_field=ArrayField(models.BigIntegerField()),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_recipe_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredient_ids',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), blank=True, default=list, editable=False, size=None, verbose_name='Идентификаторы ингредиентов'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['ingredient_ids'], name='recipe_ingredient_ids_idx'),
+        ),
+        migrations.RunPython(fill_ingredient_ids, migrations.RunPython.noop),
+    ]
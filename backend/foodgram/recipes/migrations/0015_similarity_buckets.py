@@ -0,0 +1,128 @@
+# Generated by Django 3.2.16 on 2026-10-18 05:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Параметры MinHash на момент миграции (см. recipes.similarity):
+# миграция не должна зависеть от текущего кода приложения.
+# 32 полосы по MINHASH_BAND_ROWS хешей.
+MINHASH_BAND_ROWS = 3
+MINHASH_PRIME = 2 ** 31 - 1
+MINHASH_COEFFICIENTS = [
+    (288545019, 1222356005), (1819850096, 1722851096),
+    (1640193507, 135520872), (547756575, 253228484),
+    (1063938750, 1634154402), (965274706, 1014138928),
+    (1399285262, 815217483), (1693770508, 450874518),
+    (201561927, 1047664193), (60875733, 1918383731),
+    (1794791898, 837108038), (929360196, 1304463163),
+    (1636984003, 1647458476), (4522708, 1494289708),
+    (956461719, 571940513), (1549495424, 1721909018),
+    (491263129, 1269492320), (2029953362, 219531151),
+    (1935800733, 681674953), (65691503, 47936369),
+    (54644573, 1394889710), (1162674448, 19767455),
+    (2016807462, 1892435308), (818629864, 1474212860),
+    (465143664, 2080998945), (906488443, 1558756592),
+    (62364612, 1133075550), (476079231, 1640035399),
+    (940356433, 2016845815), (1064748683, 1187256901),
+    (500545053, 742385984), (495782128, 1453521182),
+    (469828693, 1634122829), (986990923, 2044929403),
+    (622301270, 1989657836), (46148795, 893739613),
+    (1798685008, 1967674488), (1194976548, 1980384858),
+    (1379316650, 214748959), (399230660, 1351525069),
+    (2131470745, 1554002934), (1846721119, 636493528),
+    (259609209, 1595895301), (714457468, 1923233514),
+    (1549375957, 2090043303), (1527272700, 1075459163),
+    (2010990847, 2077068247), (906467885, 1090314491),
+    (1782488071, 1954607534), (1439470246, 407699194),
+    (651478927, 610227593), (1261819729, 2090470964),
+    (1895109219, 1072371851), (1817195120, 2020596306),
+    (1085088739, 844720478), (1264872717, 1832421924),
+    (74143660, 1031279582), (521280114, 1597149414),
+    (1712412589, 868202078), (889732539, 1427525847),
+    (371530573, 788392424), (1178536360, 1895652587),
+    (1509768532, 1666098668), (1448447286, 1585305640),
+    (804668616, 185687740), (942662924, 1425409027),
+    (1091837579, 231780618), (1671692786, 351539410),
+    (1118706723, 1803782207), (844508893, 795691372),
+    (1051608831, 1573602593), (63511748, 1007857332),
+    (93388247, 662561899), (1510501535, 1821713745),
+    (2111379550, 1320295954), (1273852359, 1241623302),
+    (845248882, 1389757292), (365822120, 362053496),
+    (1078549099, 487344227), (2108993534, 26417446),
+    (1654685855, 428458136), (1158819638, 1975870567),
+    (1847458227, 1177547900), (498594436, 868560209),
+    (1103316245, 738360465), (2045408137, 1819908620),
+    (1240804904, 758650493), (985977878, 1953684016),
+    (578273270, 1415653025), (1176813109, 1307699045),
+    (2055391555, 1566374975), (12260257, 823967203),
+    (1682886798, 1840284227), (1761980077, 2050087323),
+    (1903056156, 2015325779), (1590218972, 1100585228),
+]
+
+INSERT_BUCKETS_SQL = """
+    INSERT INTO {bucket_table} (recipe_id, bucket)
+    SELECT recipe_id, HASHTEXTEXTENDED(band || ':' || hashes, 0)
+    FROM (
+        SELECT recipe_id, (n - 1) / %s AS band,
+               STRING_AGG(min_hash::text, ',' ORDER BY n) AS hashes
+        FROM (
+            SELECT item.recipe_id, coefficients.n,
+                   MIN((coefficients.a * item.ingredient_id
+                        + coefficients.b) %% %s) AS min_hash
+            FROM {item_table} AS item
+            CROSS JOIN UNNEST(%s::bigint[], %s::bigint[])
+                 WITH ORDINALITY AS coefficients(a, b, n)
+            GROUP BY item.recipe_id, coefficients.n
+        ) AS signatures
+        GROUP BY recipe_id, band
+    ) AS bands
+    ON CONFLICT DO NOTHING
+"""
+
+
+def fill_similarity_buckets(apps, schema_editor):
+    SimilarityBucket = apps.get_model('recipes', 'SimilarityBucket')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    sql = INSERT_BUCKETS_SQL.format(
+        bucket_table=schema_editor.quote_name(
+            SimilarityBucket._meta.db_table),
+        item_table=schema_editor.quote_name(RecipeIngredient._meta.db_table),
+    )
+    a_values, b_values = zip(*MINHASH_COEFFICIENTS)
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(sql, (
+            MINHASH_BAND_ROWS, MINHASH_PRIME,
+            list(a_values), list(b_values),
+        ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_feed_timeline'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarityBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.BigIntegerField(verbose_name='Корзина')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similarity_buckets', to='recipes.recipe')),
+            ],
+            options={
+                'verbose_name': 'LSH-корзина рецепта',
+                'verbose_name_plural': 'LSH-корзины рецептов',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='similaritybucket',
+            index=models.Index(fields=['bucket', 'recipe'], name='similarity_bucket_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='similaritybucket',
+            constraint=models.UniqueConstraint(fields=('recipe', 'bucket'), name='unique_similarity_bucket'),
+        ),
+        migrations.RunPython(fill_similarity_buckets, migrations.RunPython.noop),
+    ]
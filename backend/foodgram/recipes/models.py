@@ -1,5 +1,8 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator, MaxValueValidator
 from .constants import (
     MIN_COOKING_TIME,
@@ -21,6 +24,12 @@ class Ingredient(models.Model):
         verbose_name = "Ингредиент"
         verbose_name_plural = "Ингредиенты"
         ordering = ["name"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=("name", "measurement_unit"),
+                name="unique_ingredient",
+            )
+        ]
 
     def __str__(self):
         return f"{self.name}, {self.measurement_unit}"
@@ -36,6 +45,9 @@ class Recipe(models.Model):
     name = models.CharField(max_length=256, verbose_name="Название")
     image = models.ImageField(upload_to="recipes/",
                               verbose_name="Картинка рецепта")
+    thumbnails = models.JSONField(
+        default=dict, blank=True, editable=False,
+        verbose_name="Уменьшенные копии картинки")
     text = models.TextField(verbose_name="Описание")
     cooking_time = models.PositiveSmallIntegerField(
         validators=[
@@ -51,6 +63,17 @@ class Recipe(models.Model):
         verbose_name="Ингредиенты",
     )
     pub_date = models.DateTimeField("Дата публикации", auto_now_add=True)
+    favorite_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="В избранном")
+    cart_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="В списках покупок")
+    ingredient_ids = ArrayField(
+        models.BigIntegerField(), default=list, blank=True, editable=False,
+        verbose_name="Идентификаторы ингредиентов")
+    search_vector = SearchVectorField(
+        null=True, editable=False, verbose_name="Поисковый вектор")
+    fanned_out = models.BooleanField(
+        default=False, editable=False, verbose_name="Разослан в ленты")
 
     def get_ingredients_with_amounts(self):
         return self.recipeingredient_set.select_related("ingredient").all()
@@ -59,6 +82,24 @@ class Recipe(models.Model):
         verbose_name = "Рецепт"
         verbose_name_plural = "Рецепты"
         ordering = ["-pub_date", "name"]
+        indexes = [
+            models.Index(fields=["-pub_date", "name"],
+                         name="recipe_pub_date_name_idx"),
+            models.Index(fields=["author", "-pub_date", "name"],
+                         name="recipe_author_pub_date_idx"),
+            models.Index(fields=["-favorite_count", "-pub_date"],
+                         name="recipe_favorite_count_idx"),
+            GinIndex(fields=["search_vector"],
+                     name="recipe_search_vector_idx"),
+            GinIndex(fields=["name"], opclasses=["gin_trgm_ops"],
+                     name="recipe_name_trgm_idx"),
+            GinIndex(fields=["ingredient_ids"],
+                     name="recipe_ingredient_ids_idx"),
+            # Рецепты, которые лента собирает при чтении (см. recipes.feed).
+            models.Index(fields=["author", "-pub_date", "-id"],
+                         name="recipe_feed_pull_idx",
+                         condition=models.Q(fanned_out=False)),
+        ]
 
     def __str__(self):
         return (
@@ -106,6 +147,92 @@ class Follow(models.Model):
         verbose_name_plural = "Данные о подписках"
         unique_together = ("user", "following")
         ordering = ["user__username", "following__username"]
+        indexes = [
+            models.Index(fields=["following", "user"],
+                         name="follow_following_user_idx"),
+        ]
 
     def __str__(self):
         return f"{self.user.username} подписан на {self.following.username}"
+
+
+class ShoppingListItem(models.Model):
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="shopping_list_items"
+    )
+    ingredient = models.ForeignKey(
+        Ingredient, on_delete=models.CASCADE, verbose_name="Ингредиент"
+    )
+    total_amount = models.IntegerField(verbose_name="Общее количество")
+
+    class Meta:
+        verbose_name = "Позиция списка покупок"
+        verbose_name_plural = "Списки покупок"
+        constraints = [
+            models.UniqueConstraint(
+                fields=("user", "ingredient"),
+                name="unique_shopping_list_item",
+            )
+        ]
+
+    def __str__(self):
+        return (
+            f"{self.user.username}: {self.ingredient.name} - "
+            f"{self.total_amount} {self.ingredient.measurement_unit}"
+        )
+
+
+class TimelineEntry(models.Model):
+    """Рецепт в ленте подписок пользователя"""
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="timeline_entries")
+    recipe = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE, related_name="timeline_entries")
+    author = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="+")
+    pub_date = models.DateTimeField("Дата публикации")
+
+    class Meta:
+        verbose_name = "Запись ленты"
+        verbose_name_plural = "Ленты подписок"
+        constraints = [
+            models.UniqueConstraint(
+                fields=("user", "recipe"),
+                name="unique_timeline_entry",
+            )
+        ]
+        indexes = [
+            models.Index(fields=["user", "-pub_date", "-recipe"],
+                         name="timeline_user_pub_date_idx"),
+            models.Index(fields=["user", "author"],
+                         name="timeline_user_author_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username}: {self.recipe.name}"
+
+
+class SimilarityBucket(models.Model):
+    """LSH-корзина рецепта для поиска похожих (см. recipes.similarity)"""
+
+    recipe = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE, related_name="similarity_buckets")
+    bucket = models.BigIntegerField("Корзина")
+
+    class Meta:
+        verbose_name = "LSH-корзина рецепта"
+        verbose_name_plural = "LSH-корзины рецептов"
+        constraints = [
+            models.UniqueConstraint(
+                fields=("recipe", "bucket"),
+                name="unique_similarity_bucket",
+            )
+        ]
+        indexes = [
+            models.Index(fields=["bucket", "recipe"],
+                         name="similarity_bucket_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.recipe_id}: {self.bucket}"
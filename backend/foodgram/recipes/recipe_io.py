@@ -0,0 +1,122 @@
+import csv
+import json
+import sys
+from itertools import islice
+
+from django.db.models import F
+
+from .models import RecipeIngredient
+
+
+CSV_FIELDS = ("author", "name", "text", "cooking_time", "image", "ingredients")
+FORMATS = ("jsonl", "csv")
+
+
+def detect_format(path, file_format=None):
+    if file_format:
+        return file_format
+    if path and path.endswith(".csv"):
+        return "csv"
+    return "jsonl"
+
+
+def open_stream(path, mode):
+    """Файл по пути или stdin/stdout, если путь равен '-'"""
+    if path == "-":
+        return sys.stdin if "r" in mode else sys.stdout
+    return open(path, mode, encoding="utf-8", newline="")
+
+
+def read_records(stream, file_format, on_error):
+    """
+    Читает рецепты по одному. Ингредиенты - список словарей
+    name, measurement_unit, amount; в CSV хранятся строкой JSON.
+    Строки, которые не удалось разобрать, передаются в
+    on_error(строка, причина) и пропускаются.
+    """
+    if file_format == "csv":
+        for row in csv.DictReader(stream):
+            try:
+                row["ingredients"] = json.loads(row["ingredients"] or "[]")
+            except json.JSONDecodeError:
+                on_error(row, "Malformed ingredients")
+                continue
+            yield row
+        return
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            on_error(line, "Malformed JSON")
+            continue
+        if not isinstance(record, dict):
+            on_error(line, "Record is not an object")
+            continue
+        yield record
+
+
+class RecordWriter:
+    def __init__(self, stream, file_format):
+        self.file_format = file_format
+        self.stream = stream
+        if file_format == "csv":
+            self.writer = csv.DictWriter(stream, fieldnames=CSV_FIELDS)
+            self.writer.writeheader()
+
+    def write(self, record):
+        if self.file_format == "csv":
+            self.writer.writerow({
+                **record,
+                "ingredients": json.dumps(record["ingredients"],
+                                          ensure_ascii=False),
+            })
+        else:
+            self.stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def iter_recipe_records(recipes, batch_size):
+    """
+    Отдает рецепты в виде словарей для выгрузки. Рецепты читаются
+    пачками по первичному ключу, ингредиенты - одним запросом на пачку.
+    """
+    last_pk = 0
+    while True:
+        batch = list(
+            recipes.filter(pk__gt=last_pk).order_by("pk")
+            .values("pk", "name", "text", "cooking_time", "image",
+                    author_email=F("author__email"))[:batch_size]
+        )
+        if not batch:
+            return
+        last_pk = batch[-1]["pk"]
+        ingredients = {}
+        rows = RecipeIngredient.objects.filter(
+            recipe_id__in=[recipe["pk"] for recipe in batch]
+        ).order_by("pk").values_list(
+            "recipe_id", "ingredient__name",
+            "ingredient__measurement_unit", "amount",
+        )
+        for recipe_id, name, measurement_unit, amount in rows:
+            ingredients.setdefault(recipe_id, []).append({
+                "name": name,
+                "measurement_unit": measurement_unit,
+                "amount": amount,
+            })
+        for recipe in batch:
+            yield {
+                "author": recipe["author_email"],
+                "name": recipe["name"],
+                "text": recipe["text"],
+                "cooking_time": recipe["cooking_time"],
+                "image": recipe["image"],
+                "ingredients": ingredients.get(recipe["pk"], []),
+            }
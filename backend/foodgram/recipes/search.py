@@ -0,0 +1,131 @@
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+)
+from django.db import transaction
+from django.db.models import (
+    Case,
+    CharField,
+    Exists,
+    F,
+    FloatField,
+    Func,
+    OuterRef,
+    Q,
+    Subquery,
+    TextField,
+    Value,
+    When,
+)
+from django.db.models.lookups import PostgresOperatorLookup
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .constants import SEARCH_CONFIG
+from .deferred import on_commit_for_recipes
+from .models import Ingredient, Recipe, RecipeIngredient
+
+
+# Поля рецепта, при изменении которых пересчитывается поисковый вектор.
+# ingredient_ids попадает в update_fields, когда меняется состав.
+SEARCH_FIELDS = {"name", "text", "ingredient_ids"}
+
+
+@CharField.register_lookup
+class TrigramWordSimilar(PostgresOperatorLookup):
+    """Строка содержит слово, похожее на значение (оператор %> pg_trgm)"""
+
+    lookup_name = "trigram_word_similar"
+    postgres_operator = "%%>"
+
+
+class TrigramWordSimilarity(Func):
+    """Похожесть значения на самое близкое слово строки"""
+
+    function = "WORD_SIMILARITY"
+    output_field = FloatField()
+
+    def __init__(self, string, expression, **extra):
+        super().__init__(Value(string), expression, **extra)
+
+
+def _ingredient_names():
+    return Subquery(
+        RecipeIngredient.objects.filter(recipe_id=OuterRef("pk"))
+        .order_by()
+        .values("recipe_id")
+        .annotate(names=StringAgg("ingredient__name", " "))
+        .values("names"),
+        output_field=TextField(),
+    )
+
+
+def get_search_vector():
+    """
+    Поисковый вектор рецепта: название (вес A), описание (вес B)
+    и названия ингредиентов (вес C) с русской морфологией.
+    """
+    return (
+        SearchVector("name", weight="A", config=SEARCH_CONFIG)
+        + SearchVector("text", weight="B", config=SEARCH_CONFIG)
+        + SearchVector(_ingredient_names(), weight="C", config=SEARCH_CONFIG)
+    )
+
+
+def update_search_vectors(recipes):
+    """Пересчитывает поисковый вектор рецептов из выборки recipes"""
+    recipes.update(search_vector=get_search_vector())
+
+
+def search_recipes(queryset, value):
+    """
+    Полнотекстовый поиск с ранжированием. Если по словам ничего
+    не найдено (например, в запросе опечатка), ищет рецепты, в названии
+    которых есть похожее слово (pg_trgm).
+
+    Выбор между ними делает сама база в том же запросе: запасное
+    условие действует, только если полнотекстовых совпадений нет
+    (NOT EXISTS без связи с внешним запросом вычисляется один раз).
+    """
+    query = SearchQuery(value, config=SEARCH_CONFIG, search_type="websearch")
+    matches_words = Q(search_vector=query)
+    return queryset.filter(
+        matches_words
+        | Q(name__trigram_word_similar=value)
+        & ~Exists(queryset.filter(matches_words))
+    ).annotate(
+        relevance=Case(
+            When(matches_words, then=SearchRank(F("search_vector"), query)),
+            default=TrigramWordSimilarity(value, "name"),
+            output_field=FloatField(),
+        )
+    ).order_by("-relevance", *Recipe._meta.ordering)
+
+
+def _update_after_commit(recipes):
+    transaction.on_commit(lambda: update_search_vectors(recipes))
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipe_search_vector(instance, update_fields, **kwargs):
+    if update_fields is not None and not SEARCH_FIELDS & set(update_fields):
+        return
+    # Ингредиенты сохраняются после рецепта, поэтому вектор
+    # пересчитывается после завершения транзакции.
+    on_commit_for_recipes(update_search_vectors, [instance.pk])
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def update_search_vector_on_ingredients_change(instance, **kwargs):
+    on_commit_for_recipes(update_search_vectors, [instance.recipe_id])
+
+
+@receiver(post_save, sender=Ingredient)
+def update_search_vectors_on_ingredient_rename(instance, created,
+                                               update_fields, **kwargs):
+    if created or (update_fields is not None and "name" not in update_fields):
+        return
+    _update_after_commit(Recipe.objects.filter(ingredients=instance))
@@ -0,0 +1,274 @@
+from collections import Counter, defaultdict
+from threading import local
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Case, F, Sum, Value, When
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+)
+from django.dispatch import receiver
+
+from .deferred import on_commit_for_recipes
+from .models import Ingredient, Recipe, RecipeIngredient, ShoppingListItem
+
+
+User = get_user_model()
+
+
+def get_ingredient_amounts(recipe_ids):
+    """Суммарное количество каждого ингредиента в указанных рецептах"""
+    amounts = Counter()
+    rows = RecipeIngredient.objects.filter(recipe_id__in=recipe_ids).values_list(
+        "ingredient_id", "amount"
+    )
+    for ingredient_id, amount in rows:
+        amounts[ingredient_id] += amount
+    return amounts
+
+
+def apply_shopping_list_deltas(user_ids, deltas):
+    """
+    Прибавляет deltas ({ingredient_id: количество}) к спискам покупок
+    пользователей. Позиции с нулевым количеством удаляются.
+    """
+    deltas = {
+        ingredient_id: delta
+        for ingredient_id, delta in deltas.items() if delta
+    }
+    user_ids = list(user_ids)
+    if not deltas or not user_ids:
+        return
+    with transaction.atomic():
+        ShoppingListItem.objects.bulk_create(
+            [
+                ShoppingListItem(user_id=user_id, ingredient_id=ingredient_id,
+                                 total_amount=0)
+                for user_id in user_ids
+                for ingredient_id, delta in deltas.items() if delta > 0
+            ],
+            ignore_conflicts=True,
+        )
+        items = ShoppingListItem.objects.filter(
+            user_id__in=user_ids, ingredient_id__in=deltas
+        )
+        items.update(total_amount=F("total_amount") + Case(
+            *(When(ingredient_id=ingredient_id, then=Value(delta))
+              for ingredient_id, delta in deltas.items()),
+            default=Value(0),
+        ))
+        items.filter(total_amount__lte=0).delete()
+
+
+def _lock_cart(recipe_ids, user_ids):
+    """
+    Блокирует строки рецептов, затем пользователей, каждые по
+    возрастанию pk. Изменения корзины и состава рецептов с общими
+    строками выполняются по очереди, а единый порядок исключает
+    взаимные блокировки.
+    """
+    list(
+        Recipe.objects.select_for_update().filter(pk__in=recipe_ids)
+        .order_by("pk").values_list("pk", flat=True)
+    )
+    return list(
+        User.objects.select_for_update().filter(pk__in=user_ids)
+        .order_by("pk").values_list("pk", flat=True)
+    )
+
+
+def update_shopping_lists_for_recipe(recipe, old_amounts):
+    """
+    Переносит изменение состава рецепта в списки покупок всех
+    пользователей, у которых он лежит в корзине: прибавляет разницу
+    между новым составом и old_amounts.
+    """
+    with transaction.atomic():
+        user_ids = _lock_cart(
+            [recipe.pk],
+            recipe.who_added_to_cart.values_list("id", flat=True),
+        )
+        deltas = get_ingredient_amounts([recipe.pk])
+        deltas.subtract(old_amounts)
+        apply_shopping_list_deltas(user_ids, deltas)
+
+
+def compute_shopping_lists(user_ids=None):
+    """
+    Считает списки покупок заново по корзинам:
+    {user_id: {ingredient_id: количество}}.
+    """
+    # Одно условие на связь: второй filter() по многозначной связи
+    # добавил бы еще один JOIN корзины и умножил суммы.
+    if user_ids is None:
+        rows = RecipeIngredient.objects.filter(
+            recipe__who_added_to_cart__isnull=False)
+    else:
+        rows = RecipeIngredient.objects.filter(
+            recipe__who_added_to_cart__in=user_ids)
+    rows = rows.values_list(
+        "recipe__who_added_to_cart", "ingredient_id"
+    ).annotate(total=Sum("amount")).order_by()
+    shopping_lists = defaultdict(dict)
+    for user_id, ingredient_id, total in rows.iterator():
+        shopping_lists[user_id][ingredient_id] = total
+    return shopping_lists
+
+
+def refresh_shopping_lists(user_ids):
+    """
+    Пересчитывает по корзинам списки покупок пользователей user_ids
+    целиком. Результат не зависит от прежнего содержимого списков.
+    """
+    with transaction.atomic():
+        user_ids = _lock_cart([], user_ids)
+        if not user_ids:
+            return
+        shopping_lists = compute_shopping_lists(user_ids)
+        ShoppingListItem.objects.filter(user_id__in=user_ids).delete()
+        ShoppingListItem.objects.bulk_create(
+            ShoppingListItem(user_id=user_id, ingredient_id=ingredient_id,
+                             total_amount=total)
+            for user_id, amounts in shopping_lists.items()
+            for ingredient_id, total in amounts.items()
+        )
+
+
+def refresh_recipe_shopping_lists(recipes):
+    """Пересчитывает списки покупок всех, у кого рецепты в корзине"""
+    refresh_shopping_lists(
+        User.objects.filter(shopping_cart__in=recipes)
+        .values_list("id", flat=True).distinct()
+    )
+
+
+def get_stored_shopping_lists(user_ids=None):
+    items = ShoppingListItem.objects.all()
+    if user_ids is not None:
+        items = items.filter(user_id__in=user_ids)
+    shopping_lists = defaultdict(dict)
+    for user_id, ingredient_id, total in items.values_list(
+        "user_id", "ingredient_id", "total_amount"
+    ).iterator():
+        shopping_lists[user_id][ingredient_id] = total
+    return shopping_lists
+
+
+@transaction.atomic
+def rebuild_shopping_lists(user_ids=None, batch_size=1000):
+    items = ShoppingListItem.objects.all()
+    if user_ids is not None:
+        items = items.filter(user_id__in=user_ids)
+    items.delete()
+    ShoppingListItem.objects.bulk_create(
+        (
+            ShoppingListItem(user_id=user_id, ingredient_id=ingredient_id,
+                             total_amount=total)
+            for user_id, amounts in compute_shopping_lists(user_ids).items()
+            for ingredient_id, total in amounts.items()
+        ),
+        batch_size=batch_size,
+    )
+
+
+def _cart_pairs(instance, reverse, pk_set):
+    """Пары (пользователи, рецепты) для изменения корзины с любой стороны"""
+    if reverse:
+        return pk_set, [instance.pk]
+    return [instance.pk], pk_set
+
+
+def _apply_cart_deltas(instance, reverse, pk_set, sign):
+    user_ids, recipe_ids = _cart_pairs(instance, reverse, pk_set)
+    amounts = get_ingredient_amounts(recipe_ids)
+    apply_shopping_list_deltas(
+        user_ids,
+        {ingredient_id: sign * amount
+         for ingredient_id, amount in amounts.items()},
+    )
+
+
+@receiver(m2m_changed, sender=User.shopping_cart.through)
+def update_shopping_lists_on_cart_change(instance, action, reverse, pk_set,
+                                         **kwargs):
+    if action == "post_add":
+        if pk_set:
+            _apply_cart_deltas(instance, reverse, pk_set, 1)
+        return
+    if action not in ("pre_add", "pre_remove", "pre_clear"):
+        return
+    related = instance.who_added_to_cart if reverse else instance.shopping_cart
+    if pk_set is None:
+        pk_set = set(related.values_list("pk", flat=True))
+    if not pk_set:
+        return
+    user_ids, recipe_ids = _cart_pairs(instance, reverse, pk_set)
+    _lock_cart(recipe_ids, user_ids)
+    # Под блокировкой видны строки корзины, которые успели добавить
+    # или удалить параллельные запросы.
+    present = set(
+        related.filter(pk__in=pk_set).values_list("pk", flat=True))
+    if action == "pre_add":
+        # Django вставляет и передает в post_add этот же набор: повторное
+        # добавление из параллельного запроса ничего не прибавит.
+        pk_set -= present
+        return
+    if present:
+        _apply_cart_deltas(instance, reverse, present, -1)
+
+
+# Рецепты и ингредиенты, которые удаляются в текущем потоке. Строки их
+# состава уходят каскадом, а списки покупок уже поправил pre_delete
+# рецепта или каскад ShoppingListItem.
+_deleting = local()
+
+
+def _deleting_ids(model):
+    if not hasattr(_deleting, model.__name__):
+        setattr(_deleting, model.__name__, set())
+    return getattr(_deleting, model.__name__)
+
+
+@receiver(pre_delete, sender=Ingredient)
+def remember_deleted_ingredient(instance, **kwargs):
+    _deleting_ids(Ingredient).add(instance.pk)
+
+
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_delete, sender=Recipe)
+def forget_deleted_object(sender, instance, **kwargs):
+    _deleting_ids(sender).discard(instance.pk)
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def update_shopping_lists_on_recipe_ingredient_change(instance, **kwargs):
+    # Изменения состава из админки: пересчет один раз после коммита
+    # для всех затронутых рецептов. Сериализатор рецептов пишет строки
+    # без сигналов и сам вызывает update_shopping_lists_for_recipe.
+    if (
+        instance.recipe_id in _deleting_ids(Recipe)
+        or instance.ingredient_id in _deleting_ids(Ingredient)
+    ):
+        return
+    on_commit_for_recipes(
+        refresh_recipe_shopping_lists, [instance.recipe_id])
+
+
+@receiver(pre_delete, sender=Recipe)
+def update_shopping_lists_on_recipe_delete(instance, **kwargs):
+    _deleting_ids(Recipe).add(instance.pk)
+    with transaction.atomic():
+        user_ids = _lock_cart(
+            [instance.pk],
+            instance.who_added_to_cart.values_list("id", flat=True),
+        )
+        deltas = get_ingredient_amounts([instance.pk])
+        apply_shopping_list_deltas(
+            user_ids,
+            {ingredient_id: -amount
+             for ingredient_id, amount in deltas.items()},
+        )
@@ -0,0 +1,134 @@
+import random
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import FloatField
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .constants import MINHASH_BAND_ROWS, MINHASH_BANDS
+from .deferred import on_commit_for_recipes
+from .models import Recipe, RecipeIngredient, SimilarityBucket
+
+
+# Хеш-функции подписи: (a * x + b) mod p. Для простого p и a > 0 разные
+# идентификаторы ингредиентов x < p получают разные хеши. Коэффициенты
+# выбираются из фиксированного зерна, чтобы совпадать во всех процессах.
+MINHASH_PRIME = 2 ** 31 - 1
+MINHASH_SEED = 1
+_random = random.Random(MINHASH_SEED)
+MINHASH_COEFFICIENTS = [
+    (_random.randrange(1, MINHASH_PRIME), _random.randrange(MINHASH_PRIME))
+    for _ in range(MINHASH_BANDS * MINHASH_BAND_ROWS)
+]
+
+INSERT_BUCKETS_SQL = f"""
+    INSERT INTO {SimilarityBucket._meta.db_table} (recipe_id, bucket)
+    SELECT recipe_id, HASHTEXTEXTENDED(band || ':' || hashes, 0)
+    FROM (
+        SELECT recipe_id, (n - 1) / %s AS band,
+               STRING_AGG(min_hash::text, ',' ORDER BY n) AS hashes
+        FROM (
+            SELECT item.recipe_id, coefficients.n,
+                   MIN((coefficients.a * item.ingredient_id
+                        + coefficients.b) %% %s) AS min_hash
+            FROM {RecipeIngredient._meta.db_table} AS item
+            CROSS JOIN UNNEST(%s::bigint[], %s::bigint[])
+                 WITH ORDINALITY AS coefficients(a, b, n)
+            WHERE item.recipe_id = ANY(%s)
+            GROUP BY item.recipe_id, coefficients.n
+        ) AS signatures
+        GROUP BY recipe_id, band
+    ) AS bands
+    ON CONFLICT DO NOTHING
+"""
+
+
+def insert_similarity_buckets(recipe_ids, using=DEFAULT_DB_ALIAS):
+    """
+    Добавляет LSH-корзины рецептов recipe_ids. MinHash-подпись набора
+    ингредиентов делится на MINHASH_BANDS полос по MINHASH_BAND_ROWS
+    хешей, каждая полоса вместе со своим номером сворачивается в bigint.
+    Рецепты с общей корзиной становятся кандидатами в похожие.
+
+    Подписи всего пакета считаются одним INSERT ... SELECT в PostgreSQL,
+    без передачи составов рецептов в Python.
+    """
+    a_values, b_values = zip(*MINHASH_COEFFICIENTS)
+    with connections[using].cursor() as cursor:
+        cursor.execute(INSERT_BUCKETS_SQL, (
+            MINHASH_BAND_ROWS, MINHASH_PRIME,
+            list(a_values), list(b_values), list(recipe_ids),
+        ))
+
+
+@transaction.atomic
+def update_similarity_buckets(recipes):
+    """Пересчитывает LSH-корзины рецептов из выборки recipes"""
+    recipe_ids = list(recipes.values_list("pk", flat=True))
+    SimilarityBucket.objects.filter(recipe_id__in=recipe_ids).delete()
+    insert_similarity_buckets(recipe_ids)
+
+
+def refresh_similarity_buckets(recipe_ids):
+    """Пересчитывает корзины рецептов после коммита транзакции"""
+    on_commit_for_recipes(update_similarity_buckets, recipe_ids)
+
+
+@transaction.atomic
+def rebuild_similarity_buckets(batch_size=1000):
+    """Заново строит корзины всех рецептов пакетами по batch_size"""
+    SimilarityBucket.objects.all().delete()
+    last_id = 0
+    while True:
+        recipe_ids = list(
+            Recipe.objects.filter(pk__gt=last_id).order_by("pk")
+            .values_list("pk", flat=True)[:batch_size]
+        )
+        if not recipe_ids:
+            break
+        insert_similarity_buckets(recipe_ids)
+        last_id = recipe_ids[-1]
+
+
+def rank_by_similarity(queryset, ingredient_ids):
+    """
+    Сортирует рецепты по коэффициенту Жаккара их набора ингредиентов
+    с ingredient_ids (размер пересечения к размеру объединения).
+    """
+    ingredient_ids = sorted(set(ingredient_ids))
+    recipe_table = Recipe._meta.db_table
+    similarity = RawSQL(
+        f"SELECT COUNT(*)::float / (CARDINALITY({recipe_table}"
+        ".ingredient_ids) + %s - COUNT(*)) FROM unnest("
+        f"{recipe_table}.ingredient_ids) AS ingredient_id"
+        " WHERE ingredient_id = ANY(%s)",
+        (len(ingredient_ids), ingredient_ids),
+        output_field=FloatField(),
+    )
+    return queryset.alias(similarity=similarity).order_by(
+        "-similarity", *Recipe._meta.ordering)
+
+
+def similar_recipes(queryset, recipe):
+    """
+    Рецепты с наиболее похожим на recipe набором ингредиентов.
+    Кандидаты — рецепты с общей LSH-корзиной, они находятся по индексу
+    SimilarityBucket без просмотра всей таблицы; их порядок задает
+    точный коэффициент Жаккара.
+    """
+    buckets = SimilarityBucket.objects.filter(recipe=recipe).values("bucket")
+    candidates = SimilarityBucket.objects.filter(
+        bucket__in=buckets).values("recipe_id")
+    return rank_by_similarity(
+        queryset.filter(pk__in=candidates).exclude(pk=recipe.pk),
+        recipe.ingredient_ids,
+    )
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def update_similarity_buckets_on_change(instance, **kwargs):
+    # Изменения из админки и удаление ингредиентов; сериализатор
+    # рецептов вызывает refresh_similarity_buckets сам.
+    refresh_similarity_buckets([instance.recipe_id])
@@ -0,0 +1,22 @@
+# Generated by Django 3.2.16 on 2026-10-18 04:00
+
+from django.db import migrations
+
+
+M2M_TABLES = ('users_myuser_favorite_recipes', 'users_myuser_shopping_cart')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_alter_myuser_shopping_cart'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=f'CREATE INDEX {table}_recipe_user_idx '
+                f'ON {table} (recipe_id, myuser_id);',
+            reverse_sql=f'DROP INDEX {table}_recipe_user_idx;',
+        )
+        for table in M2M_TABLES
+    ]